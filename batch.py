@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched Uno engine for computer-only games, vectorized with NumPy
+
+Thousands of games are kept side by side in NumPy arrays of card codes
+(see uno.card_code), one row per game: the deck and the pile, each hand
+in the order of its cards, the top code to match, the action pending,
+the current seat and the direction of play. A step plays one turn of
+every game still running at once, the skips, reverses and draws applied
+with masks over the rows. The rules are those of uno.Rules without
+house rules, and every AI level decides for all the games waiting on it
+in one call (see uno.Strategy.choose_batch_cards), the built-in ones
+with the vectorized functions here.
+
+The games draw from NumPy's random generator, not from the random
+streams of uno.simulate_games, so a seed gives other games than there:
+the engines agree on the win rates and the lengths of games, which
+check_engines measures.
+
+NumPy is only needed for BatchGames.
+
+run with: python batch.py --games 20000 --check
+"""
+
+import argparse
+import math
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    #... BatchGames needs NumPy, the rest of the module does not
+    np = None
+
+import uno
+
+#... actions on the top of the pile
+NOACTION, SKIP, REVERSE, DRAWTWO, DRAWFOUR = 0, 1, 2, 3, 4
+#... 10: skipUno; 11: reverseUno; 12: drawtwoUno; 13: wildUno; 14: drawfourUno
+RANK_ACTIONS = [NOACTION] * 10 + [SKIP, REVERSE, DRAWTWO, NOACTION, DRAWFOUR]
+NONE = uno.COLORS.index('none')
+#... the codes of a full deck, in the order UnoDeck builds it
+DECK_CODES = [card.code for card in uno.FULL_DECK]
+
+class BatchObservation:
+    '''what the computers of the games waiting on a strategy see, one
+      row per game
+    attributes:
+      games: array of the games
+      hands: array of the codes of each player's hand, in order, the
+        columns past the hand's size are not cards
+      sizes: array of the number of cards of each hand
+      matches: boolean array, True for the cards of hands that can be played
+      counts: array of the number of cards each player can play
+      playable: array of the flat indices in hands of the cards that can
+        be played, row after row, starts has where each row begins in it
+      top: array of the code to match on each pile
+      seats: array of the seat of each player
+      rng: the numpy.random.Generator of the engine'''
+
+    def __init__(self, games, hands, sizes, matches, top, seats, rng):
+        self.games = games
+        self.hands = hands
+        self.sizes = sizes
+        self.matches = matches
+        self.playable = np.flatnonzero(matches)
+        self.counts = np.bincount(self.playable // hands.shape[1], minlength=len(hands))
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.top = top
+        self.seats = seats
+        self.rng = rng
+
+    def __len__(self):
+        return len(self.seats)
+
+    def subset(self, rows):
+        '''BatchObservation.subset(rows) -> BatchObservation
+        returns the observation of the games of a mask or of indices'''
+        return BatchObservation(self.games[rows], self.hands[rows], self.sizes[rows],
+                                self.matches[rows], self.top[rows], self.seats[rows], self.rng)
+
+    def places(self, choices):
+        '''BatchObservation.places(choices) -> array
+        returns the place in the hand of the playable card chosen
+          (counted from 1) in each row, rows that can't play get 0'''
+        chosen = self.starts + np.clip(choices, 1, np.maximum(self.counts, 1)) - 1
+        return self.playable[np.minimum(chosen, len(self.playable) - 1)] % self.hands.shape[1] \
+            if len(self.playable) > 0 else np.zeros(len(self), np.intp)
+
+    def color_counts(self):
+        '''BatchObservation.color_counts() -> array
+        returns the number of cards of each color in each hand, a row
+          per game, wild cards last (see uno.COLORS)'''
+        colors = np.where(np.arange(self.hands.shape[1]) < self.sizes[:, None],
+                          self.hands // uno.NUM_RANKS, len(uno.COLORS))
+        return np.stack([(colors == color).sum(axis=1) for color in range(len(uno.COLORS))], axis=1)
+
+#... the decisions of the built-in strategies for a BatchObservation, the
+#... choices counted from 1 as in uno.Strategy (see
+#... uno.Strategy.choose_batch_cards)
+
+def first_choices(observations):
+    '''first_choices(observations) -> array
+    the first playable card, or red'''
+    return np.ones(len(observations), np.intp)
+
+def random_cards(observations):
+    '''random_cards(observations) -> array
+    a playable card at random'''
+    return observations.rng.integers(1, np.maximum(observations.counts, 1) + 1)
+
+def random_colors(observations):
+    '''random_colors(observations) -> array
+    a color at random'''
+    return observations.rng.integers(1, 5, len(observations))
+
+def action_cards(observations):
+    '''action_cards(observations) -> array
+    the choice of uno.ActionFirst: when the last playable card is an
+      action card, the one before the first card of its kind among the
+      playable cards (the last one if there is none), else a card at random'''
+    hands = observations.hands
+    rows = np.arange(len(hands))
+    code = hands[rows, observations.places(observations.counts)]
+    #... the playable cards before the first card of the kind of the last
+    #... one, the cards of a kind are all playable or none is
+    first = np.argmax(hands == code[:, None], axis=1)
+    before = np.searchsorted(observations.playable, rows * hands.shape[1] + first) \
+        - observations.starts
+    choices = random_cards(observations)
+    action = code % uno.NUM_RANKS >= 10
+    choices[action] = np.where(before == 0, observations.counts, before)[action]
+    return choices
+
+class BatchGames:
+    '''represents a batch of computer-only games played in lockstep, in
+      NumPy arrays with a row per game
+    attributes:
+      strategies: list of the uno.Strategy of each seat
+      played: list of the different strategies of the seats
+      playedBy: array of the index in played of each seat's strategy
+      rng: the numpy.random.Generator of the games
+      pyrng: the random.Random of the uno.Observations of the strategies
+        that are not vectorized
+      decks, piles: arrays of card codes, dealt from and played onto
+        the end, deckSizes and pileSizes count the cards of each
+      hands: array of the cards of each hand in order, by game and
+        seat, handSizes counts them, handRows is the same array with a
+        row per game and seat
+      top: array of the code to match on each pile, with the color
+        chosen for a wild card
+      pending: array of the action of each top card, until it is applied
+      current: array of the seat whose turn it is
+      direction: array of 1, or -1 once the order has been reversed
+      turns, drawn: arrays of the turns played and the cards drawn
+      winner: array of the winning seat, -1 while the game runs
+      active: array of the games still running'''
+
+    def __init__(self, aiLevels, numGames, seed=None):
+        '''BatchGames(aiLevels, numGames, seed) -> BatchGames
+        deals numGames games with the AI levels of aiLevels, names of
+          uno.AI_LEVELS or uno.Strategy objects as for uno.UnoComputer'''
+        if np is None:
+            raise ImportError('the batch engine needs NumPy')
+        self.strategies = [level if isinstance(level, uno.Strategy) else uno.get_strategy(level)
+                           for level in aiLevels]
+        for strategy in self.strategies:
+            if not strategy.compact:
+                raise ValueError(strategy.name + ' is not played by the batch engine')
+        #... the strategies played, and the one of each seat among them
+        self.played = []
+        for strategy in self.strategies:
+            if strategy not in self.played:
+                self.played.append(strategy)
+        if seed is not None:
+            #... a seed of any kind, as for random.Random
+            seed = random.Random(seed).getrandbits(64)
+        self.rng = np.random.default_rng(seed)
+        self.pyrng = random.Random(int(self.rng.integers(2 ** 62)))
+        self.deal(numGames, len(aiLevels))
+        self.pending = np.array(RANK_ACTIONS, np.uint8)[self.top % uno.NUM_RANKS]
+        self.turns = np.zeros(numGames, np.int32)
+        self.drawn = np.zeros(numGames, np.int32)
+        self.winner = np.full(numGames, -1, np.int8)
+        self.active = np.arange(numGames)
+        self.playedBy = np.array([self.played.index(strategy) for strategy in self.strategies])
+
+    def deal(self, numGames, numPlayers):
+        '''BatchGames.deal(numGames, numPlayers) -> None
+        deals the games as uno.simulate_game does, from as many decks
+          as the players need'''
+        codes = np.array(DECK_CODES * uno.decks_needed(numPlayers), np.uint8)
+        size = len(codes)
+        decks = self.rng.permuted(np.tile(codes, (numGames, 1)), axis=1)
+        #... the first card of the pile can't be a wild card, the wild
+        #... cards on top of the deck go under it
+        wilds = np.argmax(decks[:, ::-1] // uno.NUM_RANKS != NONE, axis=1)
+        rows = np.arange(numGames)
+        self.top = decks[rows, size - 1 - wilds]
+        decks = np.take_along_axis(decks, (np.arange(size - 1) - wilds[:, None]) % size, axis=1)
+        #... each player is dealt seven cards off the end of the deck
+        left = size - 1 - 7 * numPlayers
+        self.hands = np.zeros((numGames, numPlayers, size), np.uint8)
+        self.handRows = self.hands.reshape(numGames * numPlayers, size)
+        self.hands[:, :, :7] = decks[:, left:size - 1][:, ::-1].reshape(numGames, numPlayers, 7)
+        self.handSizes = np.full((numGames, numPlayers), 7, np.int32)
+        self.decks = np.zeros((numGames, size), np.uint8)
+        self.decks[:, :left] = decks[:, :left]
+        self.deckSizes = np.full(numGames, left, np.int32)
+        self.piles = np.zeros((numGames, size), np.uint8)
+        self.piles[:, 0] = self.top
+        self.pileSizes = np.ones(numGames, np.int32)
+        # randomly assign who goes first
+        self.current = self.rng.integers(numPlayers, size=numGames)
+        self.direction = np.ones(numGames, np.intp)
+
+    def reshuffle(self, games):
+        '''BatchGames.reshuffle(games) -> None
+        takes the piles of the games but their top card back to their
+          empty decks, shuffled'''
+        sizes = self.pileSizes[games] - 1
+        piles = self.piles[games]
+        #... a random order of the cards under the top, the rest after them
+        keys = self.rng.random(piles.shape)
+        keys[np.arange(piles.shape[1]) >= sizes[:, None]] = 2.0
+        self.decks[games] = np.take_along_axis(piles, np.argsort(keys, axis=1), axis=1)
+        self.deckSizes[games] = sizes
+        self.piles[games, 0] = piles[np.arange(len(games)), sizes]
+        self.pileSizes[games] = 1
+
+    def draw(self, games, seats):
+        '''BatchGames.draw(games, seats) -> array
+        the players of seats draw a card each, as uno.draw_one
+        returns the cards drawn, -1 where nothing was left to draw'''
+        empty = self.deckSizes[games] == 0
+        if empty.any():
+            self.reshuffle(games[empty])
+        cards = np.full(len(games), -1, np.intp)
+        drawing = self.deckSizes[games] > 0
+        games = games[drawing]
+        seats = seats[drawing]
+        sizes = self.deckSizes[games] - 1
+        self.deckSizes[games] = sizes
+        cards[drawing] = self.decks[games, sizes]
+        self.hands[games, seats, self.handSizes[games, seats]] = cards[drawing]
+        self.handSizes[games, seats] += 1
+        self.drawn[games] += 1
+        return cards
+
+    def play(self, games, seats, codes):
+        '''BatchGames.play(games, seats, codes) -> None
+        puts the cards of codes, played by the players of seats, on the
+          piles, the colors of the wild cards chosen by the strategies
+          once the cards have left the hands'''
+        self.piles[games, self.pileSizes[games]] = codes
+        self.pileSizes[games] += 1
+        self.pending[games] = ACTION_CODES[codes % uno.NUM_RANKS]
+        self.top[games] = codes
+        wild = codes // uno.NUM_RANKS == NONE
+        if wild.any():
+            games, seats, codes = games[wild], seats[wild], codes[wild]
+            choices = self.decide(self.observe(games, seats), colors=True)
+            self.top[games] = (choices - 1) * uno.NUM_RANKS + codes % uno.NUM_RANKS
+
+    def observe(self, games, seats):
+        '''BatchGames.observe(games, seats) -> BatchObservation
+        returns what the players of seats see'''
+        sizes = self.handSizes[games, seats]
+        width = int(sizes.max(initial=1))
+        hands = self.handRows[games * len(self.strategies) + seats, :width]
+        top = self.top[games]
+        #... the cards of the color or the rank of the top, and the wild cards
+        colors = hands // uno.NUM_RANKS
+        matches = (colors == (top // uno.NUM_RANKS)[:, None]) | (colors == NONE) \
+            | (hands - colors * uno.NUM_RANKS == (top % uno.NUM_RANKS)[:, None])
+        matches &= np.arange(width) < sizes[:, None]
+        return BatchObservation(games, hands, sizes, matches, top, seats, self.rng)
+
+    def decide(self, observations, colors=False):
+        '''BatchGames.decide(observations, colors) -> array
+        returns the choice of card (or of wild card color) of each
+          player observed, asked of each strategy once for all its games'''
+        choices = np.zeros(len(observations), np.intp)
+        playedBy = self.playedBy[observations.seats]
+        for index in range(len(self.played)):
+            seated = playedBy == index
+            if not colors:
+                #... the rows of players who can't play are not asked
+                seated &= observations.counts > 0
+            if not seated.any():
+                continue
+            strategy = self.played[index]
+            if colors:
+                choices[seated] = strategy.choose_batch_colors(self, observations, seated)
+            else:
+                choices[seated] = strategy.choose_batch_cards(self, observations, seated)
+        return choices
+
+    def observations(self, observations, colors):
+        '''BatchGames.observations(observations, colors) -> list
+        returns the uno.Observation of each row of a BatchObservation'''
+        result = []
+        for row in range(len(observations)):
+            hand = observations.hands[row, :observations.sizes[row]].tolist()
+            matches = [] if colors else \
+                observations.hands[row][observations.matches[row]].tolist()
+            hands = [self.hands[observations.games[row], seat, :size].tolist()
+                     for seat, size in enumerate(self.handSizes[observations.games[row]])]
+            result.append(uno.Observation(hand, matches, int(observations.top[row]),
+                                          int(observations.seats[row]), self.pyrng, hands))
+        return result
+
+    def take_turns(self, games, seats):
+        '''BatchGames.take_turns(games, seats) -> None
+        plays a turn of the players of seats, as UnoComputer.take_turn'''
+        if len(games) == 0:
+            return
+        observations = self.observe(games, seats)
+        can = observations.counts > 0
+        if can.any():
+            #... every row is decided and changed, those that can't play are
+            #... left as they were
+            choices = self.decide(observations)
+            #... the card chosen among the playable ones, counted from 1,
+            #... the first card of its kind leaves the hand, as with list.remove
+            hands = observations.hands
+            width = hands.shape[1]
+            rows = np.arange(len(hands))
+            codes = hands[rows, observations.places(choices)]
+            places = np.where(can, np.argmax(hands == codes[:, None], axis=1), width)
+            #... the cards after it move down one place
+            columns = np.arange(width - 1)
+            self.handRows[games * len(self.strategies) + seats, :width - 1] = np.take_along_axis(
+                hands, columns + (columns >= places[:, None]), axis=1)
+            self.handSizes[games, seats] -= can
+            self.play(games[can], seats[can], codes[can])
+        games, seats = games[~can], seats[~can]
+        if len(games) > 0:
+            cards = self.draw(games, seats)
+            #... a card drawn that can be played is played at once, it is
+            #... the first of its kind in the hand as nothing else could be
+            playable = cards >= 0
+            playable[playable] = MATCHES.take(self.top[games[playable]].astype(np.intp)
+                                              * uno.NUM_CODES + cards[playable])
+            if playable.any():
+                games, seats = games[playable], seats[playable]
+                self.handSizes[games, seats] -= 1
+                self.play(games, seats, cards[playable].astype(np.uint8))
+
+    def step(self):
+        '''BatchGames.step() -> int
+        plays one turn of every running game, as one pass of the
+          uno.play_game loop, returns the number of games still running'''
+        numPlayers = len(self.strategies)
+        games = self.active
+        self.turns[games] += 1
+        pending = self.pending[games]
+        #... the action is only applied once
+        self.pending[games] = NOACTION
+        current = self.current[games]
+        direction = self.direction[games]
+        #... after a reverse card the order is reversed, and the player on the
+        #... other side of the one who played it takes a turn
+        reverse = pending == REVERSE
+        direction[reverse] = -direction[reverse]
+        current[reverse] = (current[reverse] + 2 * direction[reverse]) % numPlayers
+        self.direction[games] = direction
+        #... the player hit by a DrawTwo or a DrawFour draws and misses the turn
+        for action, count in [(DRAWTWO, 2), (DRAWFOUR, 4)]:
+            hit = pending == action
+            if hit.any():
+                for n in range(count):
+                    self.draw(games[hit], current[hit])
+        playing = (pending == NOACTION) | reverse
+        self.take_turns(games[playing], current[playing])
+        won = playing & (self.handSizes[games, current] == 0)
+        self.winner[games[won]] = current[won]
+        # go to the next player
+        self.current[games] = (current + direction) % numPlayers
+        self.active = games[~won]
+        return len(self.active)
+
+    def run(self, maxTurns=10000):
+        '''BatchGames.run() -> list
+        plays every game to the end and returns their result dicts,
+          in the form of uno.run_game'''
+        steps = 0
+        while len(self.active) > 0 and steps < maxTurns:
+            self.step()
+            steps += 1
+        results = []
+        for game in range(len(self.top)):
+            seat = int(self.winner[game])
+            results.append({'winner': None if seat < 0 else 'Computer' + str(seat + 1),
+                            'seat': None if seat < 0 else seat,
+                            'turns': int(self.turns[game]),
+                            'drawn': int(self.drawn[game])})
+        return results
+
+if np is not None:
+    #... MATCHES[topcode * uno.NUM_CODES + code] is True if a card with code
+    #... can be played on topcode
+    MATCHES = np.array([list(row) for row in uno.MATCH_ROWS], bool).ravel()
+    ACTION_CODES = np.array(RANK_ACTIONS, np.uint8)
+
+def simulate_batch(n, aiLevels, seed=None, maxTurns=10000):
+    '''simulate_batch(n, aiLevels, seed) -> list
+    plays n computer-only games in lockstep, the same games for the
+      same seed
+    returns a list of result dicts, one per game'''
+    return BatchGames(aiLevels, n, seed).run(maxTurns)
+
+def check_engines(n, aiLevels, seed=0, maxTurns=10000):
+    '''check_engines(n, aiLevels, seed) -> dict
+    plays n games with each engine, returns the games per second of
+      each and how far apart their win rates by seat and mean turns
+      are, in standard errors'''
+    results = {}
+    for name, simulate in [('batch', simulate_batch), ('objects', uno.simulate_games)]:
+        start = time.perf_counter()
+        results[name] = simulate(n, aiLevels, seed, maxTurns=maxTurns)
+        results[name + '_rate'] = n / (time.perf_counter() - start)
+    gaps = {}
+    for seat in range(len(aiLevels)):
+        rates = [sum(result['seat'] == seat for result in results[name]) / n
+                 for name in ['batch', 'objects']]
+        error = math.sqrt(sum(rate * (1 - rate) for rate in rates) / n)
+        gaps['seat%d' % seat] = (rates[0] - rates[1]) / max(error, 1e-12)
+    means = []
+    variances = []
+    for name in ['batch', 'objects']:
+        turns = [result['turns'] for result in results[name]]
+        mean = sum(turns) / n
+        means.append(mean)
+        variances.append(sum((turn - mean) ** 2 for turn in turns) / (n - 1))
+    gaps['turns'] = (means[0] - means[1]) / max(math.sqrt(sum(variances) / n), 1e-12)
+    return {'gaps': gaps, 'batch_rate': results['batch_rate'],
+            'objects_rate': results['objects_rate']}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Computer-only Uno games in lockstep with NumPy')
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--levels', default='First Choice mode,Action mode,Random mode',
+                        help='AI levels of the seats, separated by commas')
+    parser.add_argument('--seed', default=0)
+    parser.add_argument('--check', action='store_true',
+                        help='play the games with uno.simulate_games too, and compare')
+    args = parser.parse_args()
+
+    levels = args.levels.split(',')
+    if args.check:
+        check = check_engines(args.games, levels, args.seed)
+        print('batch %.0f games/sec, objects %.0f games/sec' % (check['batch_rate'],
+                                                               check['objects_rate']))
+        for name, gap in check['gaps'].items():
+            print('%-6s %+.2f standard errors apart' % (name, gap))
+        #... a gap this large is one in ten thousand by chance
+        if any(abs(gap) > 4 for gap in check['gaps'].values()):
+            print('the engines disagree')
+            raise SystemExit(1)
+    else:
+        start = time.perf_counter()
+        results = simulate_batch(args.games, levels, args.seed)
+        seconds = time.perf_counter() - start
+        for seat in range(len(levels)):
+            print('%-20s %.2f%%' % (levels[seat], 100 * sum(result['seat'] == seat
+                                                              for result in results) / len(results)))
+        print('%d games in %.2f s: %.0f games/sec' % (len(results), seconds, len(results) / seconds))
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the Uno engine
+
+Every benchmark returns timings in microseconds (lower is better). The
+suite can save its results as a baseline and check a later run against
+it, failing when a timing has grown by more than the threshold. Both runs
+also time a plain Python loop, and the timings are compared relative to
+it, so a machine that is busier or slower as a whole is not a regression.
+Timings of a few microseconds vary more from run to run than the longer
+ones, they have a threshold of their own (see MICRO). The baseline keeps
+the median of a few runs, and a check times the benchmarks it finds
+slower again before failing, keeping their best timings: a busy machine
+slows a run down here and there, a regression slows every run.
+
+run with: python bench.py                  print the results
+          python bench.py --save           store the median of 3 runs in bench_baseline.json
+          python bench.py --check          compare with bench_baseline.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+import uno
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+#... the baseline microseconds below which a timing is checked against
+#... the micro threshold
+MICRO = 10.0
+
+def per_call(func, number, repeat=7):
+    '''per_call(func, number) -> float
+    returns the best microseconds per call of func over repeat runs'''
+    return 1e6 * min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+def bench_calibration(number=20000):
+    '''bench_calibration() -> dict
+    times a loop of plain Python that does not depend on the engine,
+      more often than the benchmarks as every timing is scaled by it'''
+    def loop():
+        total = 0
+        for index in range(100):
+            total += index * index
+    return {'calibration': per_call(loop, number, 21)}
+
+def string_is_match(card, other):
+    '''string_is_match(card, other) -> boolean
+    the string comparison UnoCard.is_match used before the card codes'''
+    ismatch = False
+    if card.color == other.color or card.rank == other.rank:
+        ismatch = True
+    if card.color == "none":
+        ismatch = True
+    return ismatch
+
+class ScriptedPlayer(uno.UnoPlayer):
+    '''a person who always picks the first option, without any I/O'''
+
+    def default_sink(self):
+        return None
+
+    def acknowledge(self, prompt="Press enter to continue."):
+        pass
+
+    def choose_card(self, matches):
+        return 1
+
+    def choose_color(self, icolor):
+        return 1
+
+def mid_game(numPlayers=4, turns=20, seed=1):
+    '''mid_game() -> GameState
+    returns a game of computers after a few turns'''
+    rng = random.Random(seed)
+    deck = uno.UnoDeck(rng)
+    pile = uno.UnoPile(deck)
+    players = [uno.UnoComputer('Computer' + str(n + 1), deck, 'Random mode', rng)
+               for n in range(numPlayers)]
+    state = uno.GameState(players, deck, pile)
+    uno.play_game(state, maxTurns=turns)
+    return state
+
+def bench_deck(number=5000):
+    '''bench_deck() -> dict
+    times building and shuffling a new UnoDeck'''
+    rng = random.Random(1)
+    return {'deck_new': per_call(lambda: uno.UnoDeck(rng), number)}
+
+def bench_matching(handSize=7, number=160000):
+    '''bench_matching(handSize) -> dict
+    times building the list of playable cards for one turn, with the
+      string comparisons, with UnoCard.is_match and with the card code
+      table
+    returns the microseconds per turn of each'''
+    rng = random.Random(1)
+    deck = uno.UnoDeck(rng)
+    hand = deck.deck[:handSize]
+    tops = [card for card in deck.deck[handSize:] if card.color != "none"][:16]
+
+    def by_strings():
+        for topcard in tops:
+            matches = [card for card in hand if string_is_match(card, topcard)]
+
+    def by_is_match():
+        for topcard in tops:
+            matches = [card for card in hand if card.is_match(topcard)]
+
+    def by_codes():
+        for topcard in tops:
+            row = uno.MATCH_ROWS[topcard.code]
+            matches = [card for card in hand if row[card.code]]
+
+    results = {}
+    for name, func in [('strings', by_strings), ('is_match', by_is_match), ('codes', by_codes)]:
+        results['match%d_%s' % (handSize, name)] = per_call(func, number // len(tops)) / len(tops)
+    return results
+
+def bench_take_turn(number=20000):
+    '''bench_take_turn() -> dict
+    times one take_turn of a computer and of a person with scripted
+      answers, from the same position each time (put back with
+      GameState.restore, which is part of the timing)'''
+    state = mid_game()
+    snapshot = state.snapshot()
+    seat = state.order.current
+    computer = state.order.players[seat]
+    person = ScriptedPlayer('Person', state.deck)
+    person.join(state.order, state.deck, state.pile)
+
+    def computer_turn():
+        state.restore(snapshot)
+        computer.take_turn(state.deck, state.pile)
+
+    def person_turn():
+        state.restore(snapshot)
+        person.hand[:] = computer.hand
+        person.take_turn(state.deck, state.pile)
+
+    return {'take_turn_computer': per_call(computer_turn, number),
+            'take_turn_person': per_call(person_turn, number)}
+
+def bench_reset_deck(pileSize=80, number=5000):
+    '''bench_reset_deck() -> dict
+    times taking a pile of pileSize cards back to the deck and shuffling it'''
+    rng = random.Random(1)
+    deck = uno.UnoDeck(rng)
+    pile = uno.UnoPile(deck)
+    cards = deck.deck[:pileSize]
+
+    def fill():
+        deck.deck = []
+        pile.pile = list(cards)
+
+    def reset():
+        fill()
+        deck.reset_deck(pile)
+
+    return {'reset_deck': per_call(reset, number)}
+
+def bench_lazy_deck(number=2000, numGames=200):
+    '''bench_lazy_deck() -> dict
+    times a deck shuffled up front against a lazy deck (see UnoDeck):
+      dealing a 4 player game, taking an 80 card pile back and dealing
+      10 or all of it, and whole games, short ones and long ones where
+      the pile is often taken back (6 players who draw until they can play)'''
+    rng = random.Random(1)
+    cards = uno.FULL_DECK[:80]
+    results = {}
+    for name, lazy in [('shuffled', False), ('lazy', True)]:
+        def deal():
+            deck = uno.UnoDeck(rng, None, lazy)
+            pile = uno.UnoPile(deck)
+            for n in range(4 * 7):
+                deck.deal_card()
+
+        deck = uno.UnoDeck(rng, None, lazy)
+        pile = uno.UnoPile(deck)
+
+        def reshuffle(count):
+            deck.deck = []
+            pile.pile = list(cards)
+            deck.reset_deck(pile)
+            for n in range(count):
+                deck.deal_card()
+
+        results['deal_' + name] = per_call(deal, number)
+        results['reshuffle10_' + name] = per_call(lambda: reshuffle(10), 5 * number)
+        results['reshuffle80_' + name] = per_call(lambda: reshuffle(79), number)
+        short = uno.Rules(lazyDeck=lazy)
+        long = uno.Rules(lazyDeck=lazy, drawUntilPlayable=True)
+        for games, rules, aiLevels in [('short', short, ['Random mode'] * 4),
+                                       ('long', long, ['Random mode'] * 6)]:
+            seconds = min(timeit.repeat(lambda: uno.simulate_games(numGames, aiLevels, 1, rules=rules),
+                                        number=1, repeat=5))
+            results['game_%s_%s' % (games, name)] = 1e6 * seconds / numGames
+    return results
+
+def bench_snapshot(number=10000):
+    '''bench_snapshot() -> dict
+    times copying the state of a game in the middle of play, with
+      GameState.snapshot/restore and with copy.deepcopy
+    returns the microseconds per copy of each'''
+    state = mid_game()
+    snapshot = state.snapshot()
+    return {'snapshot': per_call(state.snapshot, number),
+            'restore': per_call(lambda: state.restore(snapshot), number),
+            'deepcopy': per_call(lambda: copy.deepcopy(state), number // 100)}
+
+def bench_games(numGames=400):
+    '''bench_games() -> dict
+    times whole games between computers, and measures the memory
+      a game takes at its peak with tracemalloc'''
+    aiLevels = ['First Choice mode', 'Action mode', 'Random mode']
+    turns = sum(result['turns'] for result in uno.simulate_games(numGames, aiLevels, 1))
+    seconds = min(timeit.repeat(lambda: uno.simulate_games(numGames, aiLevels, 1),
+                                number=1, repeat=5))
+    tracemalloc.start()
+    peak = 0
+    for index in range(50):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        uno.simulate_games(1, aiLevels, index)
+        peak += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {'game': 1e6 * seconds / numGames,
+            'turn': 1e6 * seconds / turns,
+            'game_peak_bytes': peak / 50}
+
+def bench_batch(numGames=4000):
+    '''bench_batch() -> dict
+    times whole games between computers in the NumPy batch engine,
+      nothing if NumPy is not installed'''
+    #... imported here, the batch engine is optional
+    import batch
+    if batch.np is None:
+        return {}
+    aiLevels = ['First Choice mode', 'Action mode', 'Random mode']
+    seconds = min(timeit.repeat(lambda: batch.simulate_batch(numGames, aiLevels, 1),
+                                number=1, repeat=5))
+    return {'batch_game': 1e6 * seconds / numGames}
+
+BENCHMARKS = [bench_calibration, bench_deck, bench_matching, lambda: bench_matching(30), bench_take_turn,
+              bench_reset_deck, bench_lazy_deck, bench_snapshot, bench_games, bench_batch]
+
+def run_all(benchmarks=BENCHMARKS, sources=None):
+    '''run_all(benchmarks, sources) -> dict
+    runs the benchmarks, all of them by default, and returns all the
+      results, the calibration the best of its timings before and
+      after the others; sources, if given, is filled with the benchmark
+      of each result'''
+    results = {}
+    for bench in benchmarks + [bench_calibration]:
+        for name, value in bench().items():
+            results[name] = min(results.get(name, value), value)
+            if sources is not None:
+                sources[name] = bench
+    return results
+
+def run_median(runs):
+    '''run_median(runs) -> dict
+    runs every benchmark runs times, returns the median of each result'''
+    results = [run_all() for run in range(runs)]
+    return dict((name, statistics.median([result[name] for result in results]))
+                for name in results[0])
+
+def run_again(results, names, sources):
+    '''run_again(results, names, sources) -> None
+    times again the benchmarks of the named results (sources as filled
+      by run_all), keeping the best timing of each result'''
+    benchmarks = []
+    for name in names:
+        if sources[name] not in benchmarks:
+            benchmarks.append(sources[name])
+    for name, value in run_all(benchmarks).items():
+        results[name] = min(results[name], value)
+
+def regressions(results, baseline, threshold, microThreshold=1.0):
+    '''regressions(results, baseline, threshold, microThreshold) -> list
+    returns the names of the results more than threshold (a fraction)
+      above their baseline, microThreshold for the timings of less than
+      MICRO microseconds, timings scaled by the calibration loop'''
+    scale = 1.0
+    if 'calibration' in results and 'calibration' in baseline:
+        scale = results['calibration'] / baseline['calibration']
+    slower = []
+    for name, value in results.items():
+        if name == 'calibration' or name not in baseline:
+            continue
+        allowed = threshold
+        if name.endswith('_bytes'):
+            expected = baseline[name]
+        else:
+            expected = baseline[name] * scale
+            if baseline[name] < MICRO:
+                allowed = microThreshold
+        if value > expected * (1 + allowed):
+            slower.append(name)
+    return slower
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks of the Uno engine')
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--check', action='store_true', help='compare the results with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='allowed slowdown before --check fails (default 0.5)')
+    parser.add_argument('--micro-threshold', type=float, default=1.0,
+                        help='allowed slowdown of the timings under MICRO microseconds (default 1.0)')
+    parser.add_argument('--baseline', default=BASELINE)
+    args = parser.parse_args()
+
+    sources = {}
+    if args.save:
+        results = run_median(3)
+    else:
+        results = run_all(sources=sources)
+    baseline = {}
+    if args.check:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        for retry in range(2):
+            slower = regressions(results, baseline, args.threshold, args.micro_threshold)
+            if len(slower) == 0:
+                break
+            run_again(results, slower, sources)
+    for name, value in results.items():
+        line = '%-22s %12.3f' % (name, value)
+        if name in baseline:
+            line += '   baseline %12.3f  %+6.1f%%' % (baseline[name], 100 * (value / baseline[name] - 1))
+        print(line)
+    print('%.0f games/sec, %.0f turns/sec' % (1e6 / results['game'], 1e6 / results['turn']))
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+    if args.check:
+        slower = regressions(results, baseline, args.threshold, args.micro_threshold)
+        if len(slower) > 0:
+            print('slower than the baseline: ' + ', '.join(slower))
+            sys.exit(1)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exact endgame solver for the "Endgame mode" computer level
+
+Once every hand is down to a few cards, the game is searched to the end
+with every hand and the order of the deck known. Positions are compact
+tuples: the top code (with the color of a wild card), the pending
+action, the position in the turn order and its direction, each hand as
+sorted bytes of card codes, and the deck as bytes, dealt from the end.
+Nothing is random until the pile has to be shuffled back into the
+deck, so every position has one outcome and the search stops there.
+
+The search is for one seat and is paranoid: the other players are taken
+to play together against it, whatever their strategies. A position is
+won for the seat if one of its moves leads to a won position on its
+turn, and every move of the player to move does on another player's
+turn, so a win found is a win by force however many players there are.
+The outcome of a position is True when it is won for the seat, False
+when the others can make one of them win first, or None when the search
+can't tell (a reshuffle, more than maxTurns turns away, or more than
+maxNodes positions to search).
+
+Only the known outcomes are kept, in a transposition table keyed by the
+seat searched for and the position: a hand holding the same cards in
+another order is the same position. A move is searched a few turns
+deep, then deeper, so a quick win is found first, within a budget of
+positions per move. The table drops the position used least recently
+once its estimated size passes the memory budget. The solver only knows
+the standard rules (see uno.Rules): in a game with house rules, or with
+a lazy deck, it finds nothing (see solvable).
+
+A search AI can stop a play-out early with EndgameSolver.solve on a
+position (see known_position).
+
+run with: python endgame.py --budget 1 --games 200   checks that the
+          memory the table takes stays within its budget
+"""
+
+import argparse
+from collections import OrderedDict
+import gc
+import random
+import sys
+import tracemalloc
+
+import batch
+import uno
+
+#... the memory budget of the shared table, in bytes
+DEFAULT_BUDGET = 64 * 1024 * 1024
+#... turns searched before a position counts as unknown
+MAX_TURNS = 200
+#... positions searched per move before the search gives up
+MAX_NODES = 20000
+#... estimated bytes of a table entry besides its cards: the key tuple,
+#... the bytes objects of the hands and the deck, the table's node;
+#... an entry measures 330 to 400 bytes with its cards, depending on how
+#... full the table's dict is (see check_budget), so a table of 1 MB or
+#... more stays within its budget
+ENTRY_BYTES = 360
+
+def entry_size(key):
+    '''entry_size(key) -> int
+    returns the estimated bytes a position takes in the table'''
+    return ENTRY_BYTES + len(key[6]) + sum(len(hand) for hand in key[5])
+
+class EndgameSolver:
+    '''searches endgames to the end, with a transposition table
+    attributes:
+      budget: the most bytes the table is estimated to take
+      maxTurns: the turns searched before a position counts as unknown
+      maxNodes: the positions searched per call before giving up
+      horizon: the turns the search is going to
+      table: OrderedDict of the outcome of each position, the most
+        recently used last
+      size: the estimated bytes of the table
+      hits, misses, evictions: counters of the table'''
+
+    def __init__(self, budget=DEFAULT_BUDGET, maxTurns=MAX_TURNS, maxNodes=MAX_NODES):
+        self.budget = budget
+        self.maxTurns = maxTurns
+        self.maxNodes = maxNodes
+        self.horizon = maxTurns
+        self.nodes = 0
+        self.table = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def remember(self, key, outcome):
+        '''EndgameSolver.remember(key, outcome) -> None
+        keeps the outcome of a position, dropping the least recently
+          used ones to stay within the budget'''
+        table = self.table
+        if key in table:
+            return
+        table[key] = outcome
+        self.size += entry_size(key)
+        while self.size > self.budget and len(table) > 1:
+            old, value = table.popitem(last=False)
+            self.size -= entry_size(old)
+            self.evictions += 1
+
+    def outcome(self, seat, top, pending, current, reverse, hands, deck, depth=0):
+        '''EndgameSolver.outcome(seat, top, pending, current, reverse, hands, deck) -> bool
+        returns True if seat wins from a position whatever the others
+          play, False if they can make one of them win, None if unknown'''
+        if depth >= self.horizon or self.nodes >= self.maxNodes:
+            return None
+        key = (seat, top, pending, current, reverse, hands, deck)
+        table = self.table
+        if key in table:
+            self.hits += 1
+            table.move_to_end(key)
+            return table[key]
+        self.misses += 1
+        self.nodes += 1
+        numPlayers = len(hands)
+        result = None
+        if pending == batch.NOACTION or pending == batch.REVERSE:
+            if pending == batch.REVERSE:
+                #... the player who played the reverse card plays the next turn
+                #... from the other side
+                justPlayerNum = (current + numPlayers - 1) % numPlayers
+                reverse ^= 1
+                current = (numPlayers - justPlayerNum) % numPlayers
+            result = self.turn(seat, top, current, reverse, hands, deck, depth)
+        elif pending == batch.SKIP:
+            result = self.outcome(seat, top, batch.NOACTION, (current + 1) % numPlayers, reverse,
+                                  hands, deck, depth + 1)
+        else:
+            count = 2 if pending == batch.DRAWTWO else 4
+            #... the pile would be shuffled back in
+            if len(deck) >= count:
+                mover = numPlayers - 1 - current if reverse else current
+                hands = self.replace(hands, mover, bytes(sorted(hands[mover] + deck[-count:])))
+                result = self.outcome(seat, top, batch.NOACTION, (current + 1) % numPlayers,
+                                      reverse, hands, deck[:-count], depth + 1)
+        #... a known outcome does not depend on how far the search went,
+        #... an unknown one may be known to a deeper search
+        if result is not None:
+            self.remember(key, result)
+        return result
+
+    def replace(self, hands, seat, hand):
+        '''EndgameSolver.replace(hands, seat, hand) -> tuple
+        returns the hands with the hand of seat replaced'''
+        return hands[:seat] + (hand,) + hands[seat + 1:]
+
+    def moves(self, top, hand):
+        '''EndgameSolver.moves(top, hand) -> list
+        returns the (code, color index) moves open to a hand, the color
+          is None for a card that is not wild'''
+        row = uno.MATCH_ROWS[top]
+        moves = []
+        last = None
+        for code in hand:
+            if code == last or not row[code]:
+                continue
+            last = code
+            if code // uno.NUM_RANKS == batch.NONE:
+                moves += [(code, color) for color in range(4)]
+            else:
+                moves.append((code, None))
+        return moves
+
+    def play(self, move, seat, mover, current, reverse, hands, deck, depth):
+        '''EndgameSolver.play(move, seat, mover, ...) -> bool
+        returns the outcome for seat once mover has played the move
+          from its hand'''
+        code, color = move
+        hand = hands[mover]
+        index = hand.index(code)
+        hand = hand[:index] + hand[index + 1:]
+        if len(hand) == 0:
+            return mover == seat
+        rank = code % uno.NUM_RANKS
+        top = code if color is None else color * uno.NUM_RANKS + rank
+        return self.outcome(seat, top, batch.RANK_ACTIONS[rank], (current + 1) % len(hands),
+                            reverse, self.replace(hands, mover, hand), deck, depth + 1)
+
+    def choose(self, moves, seat, mover, current, reverse, hands, deck, depth):
+        '''EndgameSolver.choose(moves, seat, mover, ...) -> bool
+        returns the outcome for seat of the best of mover's moves: seat
+          wins if one of its own moves wins, or if every move of another
+          player does'''
+        #... seat looks for a True, the others for a False
+        wanted = mover == seat
+        result = not wanted
+        for move in moves:
+            outcome = self.play(move, seat, mover, current, reverse, hands, deck, depth)
+            if outcome is wanted:
+                return outcome
+            if outcome is None:
+                result = None
+        return result
+
+    def turn(self, seat, top, current, reverse, hands, deck, depth):
+        '''EndgameSolver.turn(seat, top, current, reverse, hands, deck) -> bool
+        returns the outcome for seat of the turn of the player at current'''
+        numPlayers = len(hands)
+        mover = numPlayers - 1 - current if reverse else current
+        hand = hands[mover]
+        moves = self.moves(top, hand)
+        if len(moves) > 0:
+            return self.choose(moves, seat, mover, current, reverse, hands, deck, depth)
+        if len(deck) == 0:
+            #... the pile would be shuffled back in
+            return None
+        card = deck[-1]
+        deck = deck[:-1]
+        hands = self.replace(hands, mover, bytes(sorted(hand + bytes([card]))))
+        if uno.MATCH_ROWS[top][card]:
+            #... the card drawn is played at once
+            return self.choose(self.moves(top, bytes([card])), seat, mover, current, reverse,
+                               hands, deck, depth)
+        return self.outcome(seat, top, batch.NOACTION, (current + 1) % numPlayers, reverse,
+                            hands, deck, depth + 1)
+
+    def solve(self, position, seat):
+        '''EndgameSolver.solve(position, seat) -> bool
+        returns True if seat wins a position of the batch engine by
+          force, False if the others can make one of them win, None if
+          unknown'''
+        self.nodes = 0
+        self.horizon = self.maxTurns
+        return self.outcome(seat, position['top'], position['pending'], position['current'],
+                            position['reverse'], compact_hands(position['hands']),
+                            bytes(position['deck']))
+
+    def winning_move(self, position, seat, matches):
+        '''EndgameSolver.winning_move(position, seat, matches) -> (int, int)
+        returns the (code, color index) move among the codes of matches
+          that wins by force for seat, the player to move at a position
+          of the batch engine, or None if the search finds none'''
+        self.nodes = 0
+        hands = compact_hands(position['hands'])
+        deck = bytes(position['deck'])
+        moves = self.moves(position['top'], bytes(sorted(matches)))
+        #... the nearer wins first, each search reuses the outcomes known
+        horizon = 8
+        while self.nodes < self.maxNodes:
+            self.horizon = min(horizon, self.maxTurns)
+            for move in moves:
+                if self.play(move, seat, seat, position['current'], position['reverse'],
+                             hands, deck, 0):
+                    return move
+            if self.horizon == self.maxTurns:
+                break
+            horizon *= 2
+        return None
+
+def compact_hands(hands):
+    '''compact_hands(hands) -> tuple
+    returns the hands as sorted bytes of card codes'''
+    return tuple(bytes(sorted(hand)) for hand in hands)
+
+def known_position(player):
+    '''known_position(player) -> dict
+    returns the position of the player's game as a dict of the deck, the
+      pile and the hands (byte arrays of card codes), the top code to
+      match, the pending action, the current position in the turn order
+      and the reverse flag, every hand as it is'''
+    order = player.order
+    numPlayers = len(order.players)
+    if order.direction == 1:
+        current, reverse = order.current, 0
+    else:
+        current, reverse = numPlayers - 1 - order.current, 1
+    return {'deck': uno.hand_codes(player.deck.deck),
+            'pile': uno.hand_codes(player.pile.pile),
+            'hands': [uno.hand_codes(other.hand) for other in order.players],
+            'top': player.pile.top_code(), 'pending': batch.NOACTION,
+            'current': current, 'reverse': reverse}
+
+#... the solver shared by the computers, created when first needed
+SOLVER = None
+
+def shared_solver():
+    '''shared_solver() -> EndgameSolver
+    returns the solver shared by the "Endgame mode" computers'''
+    global SOLVER
+    if SOLVER is None:
+        SOLVER = EndgameSolver()
+    return SOLVER
+
+#... the number of cards of each code in a deck, and the codes of the wild cards
+DECK_COUNTS = [0] * uno.NUM_CODES
+for card in uno.FULL_DECK:
+    DECK_COUNTS[card.code] += 1
+WILD_CODES = sorted(set([card.code for card in uno.FULL_DECK if card.color == "none"]))
+
+def solvable(player):
+    '''solvable(player) -> boolean
+    returns True if the solver can search the player's game: standard
+      rules and a deck shuffled up front'''
+    rules = player.rules
+    #... a lazy deck has no order to search
+    return not (player.deck.lazy or rules.stacking or rules.drawUntilPlayable
+                or rules.jumpIn or rules.sevenZero)
+
+def winning_color(player):
+    '''winning_color(player) -> str
+    returns the color to give the wild card the player is playing
+      without having chosen it (a card drawn and played at once) that
+      keeps a win by force, or None if the solver finds none'''
+    if not solvable(player):
+        return None
+    position = known_position(player)
+    #... the card is neither in the hand nor on the pile yet: it is the
+    #... wild card a deck has more of than the game holds
+    counts = [0] * uno.NUM_CODES
+    for codes in [position['deck'], position['pile']] + position['hands']:
+        for code in codes:
+            counts[code] += 1
+    missing = [code for code in WILD_CODES if counts[code] < DECK_COUNTS[code]]
+    if len(missing) != 1:
+        return None
+    seat = player.order.players.index(player)
+    position['hands'][seat].append(missing[0])
+    move = shared_solver().winning_move(position, seat, missing)
+    if move is None:
+        return None
+    return uno.COLORS[move[1]]
+
+def search(player, matches):
+    '''search(player, matches) -> (UnoCard, str)
+    returns a card of matches that wins by force for the player and the
+      color to give it (None for a card that is not wild), or None if
+      the solver finds no such move'''
+    if not solvable(player):
+        return None
+    seat = player.order.players.index(player)
+    move = shared_solver().winning_move(known_position(player), seat,
+                                        [card.code for card in matches])
+    if move is None:
+        return None
+    code, color = move
+    card = [card for card in matches if card.code == code][0]
+    return card, None if color is None else uno.COLORS[color]
+
+def check_budget(budget, numGames, aiLevels, seed=0):
+    '''check_budget(budget, numGames, aiLevels) -> (int, int)
+    plays numGames games, "Endgame mode" computers sharing a solver of
+      budget bytes, and measures the memory the solver holds between
+      games with tracemalloc, when its table is all that is left
+    returns the most bytes held and the positions in the table at the end'''
+    global SOLVER
+    shared = SOLVER
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        SOLVER = EndgameSolver(budget)
+        peak = 0
+        for index in range(numGames):
+            uno.simulate_game(aiLevels, random.Random(uno.game_seed(seed, index)))
+            #... the players and their game are a cycle of references
+            gc.collect()
+            peak = max(peak, tracemalloc.get_traced_memory()[0] - before)
+        return peak, len(SOLVER.table)
+    finally:
+        tracemalloc.stop()
+        SOLVER = shared
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Memory check of the endgame solver')
+    parser.add_argument('--budget', type=float, default=1.0, help='budget of the table in MB')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--levels', default='Endgame mode,Random mode,Action mode',
+                        help='AI levels of the seats, separated by commas')
+    parser.add_argument('--seed', default=0)
+    args = parser.parse_args()
+
+    budget = int(args.budget * 1024 * 1024)
+    #... the computers search with the module uno imports, not this script
+    import endgame
+    peak, entries = endgame.check_budget(budget, args.games, args.levels.split(','), args.seed)
+    print('peak %.0f bytes of a budget of %d (%.1f%%), %d positions in the table' % (
+        peak, budget, 100 * peak / budget, entries))
+    if peak > budget:
+        sys.exit(1)
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Structured event stream of Uno games, fanned out to subscribers
+
+An EventStream is the event sink of a game (see uno.console_sink for the
+events). It turns every event into a GameEvent, a record of numbers and
+strings only (seats, card codes, names), so a record still tells what
+happened after the game has moved on. The record goes on the bounded
+queue of each subscriber: a terminal renderer, a log, a spectator. A
+full queue never holds up the game, it makes room by its policy:
+
+  "drop-newest"   the new event is not queued
+  "drop-oldest"   the oldest event queued is dropped
+  "coalesce"      an event waiting is dropped once a later one of the
+                  same kind makes it stale ("status", "turn" and the
+                  options offered), and the oldest when it is full
+
+Subscribers read their queue at their own pace, from another thread
+(Subscription.get, or EventStream.spawn with a handler) or by polling
+it (Subscription.poll, for an asyncio loop). A sink that must see every
+event as it happens (metrics.Metrics, gamelog.LogWriter) is passed on
+as the stream's forward sink instead.
+
+The names of the cards and hands are cached (uno.CARD_TEXTS and
+UnoHand.text), so rendering a turn doesn't build them again.
+
+run with: python events.py --games 3 --seed 1
+"""
+
+import argparse
+from collections import deque
+import threading
+
+import uno
+
+POLICIES = ['drop-newest', 'drop-oldest', 'coalesce']
+#... the kinds of events a later one of the same kind makes stale
+STALE_KINDS = frozenset(['status', 'turn', 'choices', 'colors', 'players'])
+
+#... the text of the events of one line, by kind, %s is the player's name
+RENDER_LINES = {
+    "cantplay": "You can't play, so you have to draw.",
+    "nodraw": "There are no cards left to draw.",
+    "skip": "%s, it's your turn.\nSorry, your turn was skipped! Better luck next time!",
+    "reverse": "The reverse card has been played so the playing order has to be reversed.",
+    "drawtwo": "%s, it's your turn.\nSorry, you have to draw two cards and you can't play"
+               " because a DrawTwo card has been played.",
+    "drawfour": "%s, it's your turn.\nSorry, you have to draw four cards and you can't play"
+                " because a Wild DrawFour card has been played.",
+    "stack": "%s passes the penalty on to the next player.",
+    "jumpin": "%s jumps in with the same card!",
+    "rotate": "Every hand is passed on to the next player."}
+
+class GameEvent:
+    '''a game event, as numbers and strings
+    attributes:
+      seq: the number of the event in the stream, counted from 0
+      turn: the turn of the game it happened in
+      kind: the name of the event (see uno.console_sink)
+      seat: the seat of the player it is about, None for none
+      name: the name of that player, None for none
+      card: the code of the card it is about, for "turn" the top of the
+        pile with the color to match, None for none
+      data: a tuple of the rest: the names and hand sizes for "start"
+        and "status", the codes of the hand for "turn", the options
+        for "choices", "colors" and "players", the color given a card
+        played, True for a card drawn that can be played, the seat
+        swapped with'''
+
+    __slots__ = ('seq', 'turn', 'kind', 'seat', 'name', 'card', 'data')
+
+    def __init__(self, seq, turn, kind, seat=None, name=None, card=None, data=()):
+        self.seq = seq
+        self.turn = turn
+        self.kind = kind
+        self.seat = seat
+        self.name = name
+        self.card = card
+        self.data = data
+
+    def __repr__(self):
+        return 'GameEvent(%d, %d, %r, %r, %r, %r, %r)' % (
+            self.seq, self.turn, self.kind, self.seat, self.name, self.card, self.data)
+
+class Subscription:
+    '''a subscriber's bounded queue of GameEvents
+    attributes:
+      maxsize: the most events queued
+      policy: what a full queue does with a new event (see POLICIES)
+      queue: deque of the events not read yet, those in stale included
+      stale: set of the ids of the queued events a later one has made
+        stale, skipped when read ("coalesce")
+      latest: dict of the last event queued of each stale kind, by kind
+      dropped: the events dropped or made stale
+      closed: True once no more events will come'''
+
+    def __init__(self, maxsize=1024, policy='drop-oldest'):
+        if policy not in POLICIES:
+            raise ValueError('unknown queue policy ' + str(policy))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = deque()
+        self.stale = set()
+        self.latest = {}
+        self.dropped = 0
+        self.closed = False
+        self.ready = threading.Condition()
+
+    def __len__(self):
+        '''len(Subscription) -> int
+        returns the number of events waiting to be read'''
+        return len(self.queue) - len(self.stale)
+
+    def take(self):
+        '''Subscription.take() -> GameEvent
+        takes the oldest event waiting off the queue, the lock held'''
+        while True:
+            event = self.queue.popleft()
+            if id(event) in self.stale:
+                self.stale.discard(id(event))
+                continue
+            if self.latest.get(event.kind) is event:
+                del self.latest[event.kind]
+            return event
+
+    def offer(self, event):
+        '''Subscription.offer(event) -> None
+        queues an event without waiting, making room by the policy'''
+        with self.ready:
+            if len(self) >= self.maxsize and self.policy == 'drop-newest':
+                self.dropped += 1
+                return
+            if self.policy == 'coalesce' and event.kind in STALE_KINDS:
+                old = self.latest.get(event.kind)
+                if old is not None:
+                    #... left in the queue, skipped when read
+                    self.stale.add(id(old))
+                    self.dropped += 1
+                self.latest[event.kind] = event
+            if len(self) >= self.maxsize:
+                self.take()
+                self.dropped += 1
+            self.queue.append(event)
+            if len(self.stale) > self.maxsize:
+                stale = self.stale
+                self.queue = deque([queued for queued in self.queue if id(queued) not in stale])
+                stale.clear()
+            self.ready.notify()
+
+    def get(self, timeout=None):
+        '''Subscription.get(timeout) -> GameEvent
+        returns the next event, waiting for it up to timeout seconds
+          (for ever if None), None if none came or the stream is closed'''
+        with self.ready:
+            if len(self) == 0 and not self.closed:
+                self.ready.wait(timeout)
+            if len(self) == 0:
+                return None
+            return self.take()
+
+    def poll(self):
+        '''Subscription.poll() -> list
+        returns the events waiting, without waiting'''
+        with self.ready:
+            events = [queued for queued in self.queue if id(queued) not in self.stale]
+            self.queue.clear()
+            self.stale.clear()
+            self.latest.clear()
+        return events
+
+    def close(self):
+        '''Subscription.close() -> None
+        tells the reader no more events will come'''
+        with self.ready:
+            self.closed = True
+            self.ready.notify_all()
+
+class EventStream:
+    '''the event sink of a game that publishes GameEvents to subscribers
+    attributes:
+      subscriptions: list of the Subscriptions
+      forward: the sink every event is passed on to as it happens, or None
+      seq: the number of events published
+      turn: the turn being played
+      seats: dict of the seat of each player, by id'''
+
+    def __init__(self, forward=None):
+        self.subscriptions = []
+        self.forward = forward
+        self.seq = 0
+        self.turn = 0
+        self.seats = {}
+        self.threads = []
+
+    def subscribe(self, maxsize=1024, policy='drop-oldest'):
+        '''EventStream.subscribe(maxsize, policy) -> Subscription
+        returns a new queue getting every event from now on'''
+        subscription = Subscription(maxsize, policy)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        '''EventStream.unsubscribe(subscription) -> None
+        stops queueing events for a subscription and closes it'''
+        self.subscriptions.remove(subscription)
+        subscription.close()
+
+    def spawn(self, handler, maxsize=1024, policy='drop-oldest'):
+        '''EventStream.spawn(handler) -> Subscription
+        subscribes handler, a callable taking a GameEvent, and calls it
+          with the events on a thread of its own until the stream closes'''
+        subscription = self.subscribe(maxsize, policy)
+
+        def pump():
+            while True:
+                event = subscription.get()
+                if event is None:
+                    if subscription.closed:
+                        return
+                    continue
+                handler(event)
+        thread = threading.Thread(target=pump, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return subscription
+
+    def close(self, wait=True):
+        '''EventStream.close(wait) -> None
+        closes every subscription, waits for the spawned handlers to
+          read what is left if wait'''
+        for subscription in self.subscriptions:
+            subscription.close()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+        self.threads = []
+
+    def record(self, event, args):
+        '''EventStream.record(event, args) -> GameEvent
+        returns the record of an event of the game'''
+        seq = self.seq
+        turn = self.turn
+        if event == "start":
+            order, pile = args
+            self.seats = dict((id(player), seat) for seat, player in enumerate(order.players))
+            return GameEvent(seq, turn, event, card=pile.top_code(),
+                             data=tuple((player.name, len(player.hand)) for player in order.players))
+        if event == "status":
+            return GameEvent(seq, turn, event,
+                             data=tuple((player.name, len(player.hand)) for player in args[0]))
+        player = args[0]
+        seat = self.seats.get(id(player))
+        if event == "turn":
+            return GameEvent(seq, turn, event, seat, player.name, args[1].top_code(),
+                             tuple([card.code for card in player.hand]))
+        if event == "choices" or event == "colors" or event == "players":
+            return GameEvent(seq, turn, event, seat, player.name,
+                             data=tuple([str(option) for option in args[1]]))
+        if event == "play":
+            card, pile = args[1], args[2]
+            return GameEvent(seq, turn, event, seat, player.name, card.code, (pile.color,))
+        if event == "draw":
+            return GameEvent(seq, turn, event, seat, player.name, args[1].code, (args[2],))
+        if event == "penalty":
+            return GameEvent(seq, turn, event, seat, player.name, args[1].code)
+        if event == "swap":
+            return GameEvent(seq, turn, event, seat, player.name,
+                             data=(self.seats.get(id(args[1])), args[1].name))
+        return GameEvent(seq, turn, event, seat, player.name)
+
+    def __call__(self, event, *args):
+        '''EventStream(event, *args) -> None
+        the event sink: publishes the event to every subscriber'''
+        if event == "start":
+            self.turn = 0
+        elif event == "status":
+            self.turn += 1
+        if len(self.subscriptions) > 0:
+            record = self.record(event, args)
+            self.seq += 1
+            for subscription in self.subscriptions:
+                subscription.offer(record)
+        if self.forward is not None:
+            self.forward(event, *args)
+
+def render(event):
+    '''render(event) -> str
+    returns the console text of a GameEvent, as uno.console_sink
+      prints it ('' for the events it doesn't print)'''
+    kind = event.kind
+    if kind == "status":
+        return '-------\n' + ''.join(['%s has %d cards.\n' % player for player in event.data]) \
+               + '-------'
+    if kind == "turn":
+        return (event.name + ", it's your turn.\nThe pile has " + uno.CARD_TEXTS[event.card]
+                + ' on top.\nYour hand: \n' + ''.join([uno.CARD_TEXTS[code] + '\n'
+                                                       for code in event.data]))
+    if kind == "choices" or kind == "colors" or kind == "players":
+        return '\n'.join([str(index + 1) + ': ' + event.data[index]
+                          for index in range(len(event.data))])
+    if kind == "play":
+        color = event.data[0]
+        return 'The pile has ' + uno.CARD_TEXTS[uno.card_code(event.card % uno.NUM_RANKS, color)] \
+               + ' on top.'
+    if kind == "draw":
+        return 'You drew: ' + uno.CARD_TEXTS[event.card] + '\n' + (
+            "Good -- you can play that!" if event.data[0] else "Sorry, you still can't play.")
+    if kind == "win":
+        return event.name + " wins!\nThanks for playing!"
+    if kind == "swap":
+        return event.name + " swaps hands with " + event.data[1] + "."
+    if kind not in RENDER_LINES:
+        return ''
+    line = RENDER_LINES[kind]
+    return line % event.name if '%s' in line else line
+
+def terminal_renderer(event):
+    '''terminal_renderer(event) -> None
+    prints a GameEvent as the console does'''
+    text = render(event)
+    if text:
+        print(text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Uno games between computers, watched through an event stream')
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--levels', default='First Choice mode,Action mode,Random mode',
+                        help='AI levels of the seats, separated by commas')
+    parser.add_argument('--seed', default=None)
+    parser.add_argument('--policy', choices=POLICIES, default='drop-oldest')
+    parser.add_argument('--queue', type=int, default=1024, help='events a subscriber can fall behind')
+    args = parser.parse_args()
+
+    stream = EventStream()
+    console = stream.spawn(terminal_renderer, args.queue, args.policy)
+    uno.simulate_games(args.games, args.levels.split(','), args.seed, stream)
+    stream.close()
+    if console.dropped > 0:
+        print('(%d events dropped)' % console.dropped)
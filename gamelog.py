@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact binary logs of Uno games
+
+A log file starts with MAGIC and holds fixed 3-byte records
+(kind, a, b), written by LogWriter.sink as the game events come in:
+
+  GAME                      a new game starts
+  SEED, 2 bytes             the seed of the game, 2 bytes of text per record
+  PLAYERS, number, first    the number of players and the first seat to play
+  NAME, 2 bytes             the name of the next AI level of the log, 2 bytes
+                            of text per record, ended by a zero byte
+  LEVEL, seat, level        the number of a computer's AI level among the
+                            NAMEs of the log so far, counted from 1, 0 for
+                            a person
+  DEAL, seat, code          a card of the first hand of a seat
+  TOP, 0, code              the first card of the pile
+  TURN, seat, 0             a turn of the run_game loop starts at seat
+  PLAY, seat, code          a card played
+  COLOR, seat, color        the color chosen for the wild card just played
+  DRAW, seat, code          a card drawn because nothing could be played
+  PENALTY, seat, code       a card drawn for a DrawTwo or a DrawFour
+  NODRAW, seat, 0           nothing was left to draw
+  SKIP / DRAWTWO / DRAWFOUR, seat, 0
+  REVERSE, seat, 0          seat is the player who played the reverse card
+  WIN, seat, 0
+  SWAP, seat, other         seat swapped hands with other (after a 7)
+  ROTATE, seat, 0           every hand moved on in the direction of play
+                            (after a 0 played by seat)
+  JUMPIN, seat, 0           seat plays the card on top out of turn, its
+                            PLAY record follows
+  STACK, seat, 0            seat passes the penalty on, its PLAY follows
+
+Cards are stored as their code (see uno.card_code), so the position at any
+turn can be rebuilt from the records alone. The log names each AI level
+the first time a game of it plays one, so its numbers do not depend on
+the levels registered (uno.AI_LEVELS) when it is read. Every kind byte sits at a
+multiple of 3 past the header, so the reader finds games and turns with
+regular expressions that step over whole records of the mapped file
+instead of decoding every record.
+"""
+
+import mmap
+import random
+import re
+import struct
+
+import uno
+
+MAGIC = b'UNO2'
+#... a log of numbers of uno.AI_LEVELS in place of NAME records
+MAGIC_LEVELS = b'UNO1'
+RECORD = struct.Struct('<BBB')
+
+GAME, SEED, PLAYERS, LEVEL, DEAL, TOP, TURN, PLAY, COLOR, DRAW, PENALTY, \
+    NODRAW, SKIP, REVERSE, DRAWTWO, DRAWFOUR, WIN, SWAP, ROTATE, JUMPIN, STACK, NAME = range(1, 23)
+KIND_NAMES = ['', 'game', 'seed', 'players', 'level', 'deal', 'top', 'turn',
+              'play', 'color', 'draw', 'penalty', 'nodraw', 'skip', 'reverse',
+              'drawtwo', 'drawfour', 'win', 'swap', 'rotate', 'jumpin', 'stack', 'name']
+ACTION_KINDS = {"skip": SKIP, "reverse": REVERSE, "drawtwo": DRAWTWO,
+                "drawfour": DRAWFOUR, "win": WIN, "nodraw": NODRAW,
+                "rotate": ROTATE, "jumpin": JUMPIN, "stack": STACK}
+
+class LogWriter:
+    '''writes games to a binary log as they are played
+    attributes:
+      file: the binary file the records go to
+      order: the TurnOrder of the game being written
+      seats: dict from id(player) to the player's seat
+      levels: list of the AI levels named in the log so far
+      forward: an optional sink that also gets every event'''
+
+    def __init__(self, file, forward=None):
+        '''LogWriter(file) -> LogWriter
+        file is a path, or a binary file open for writing at its start'''
+        if isinstance(file, str):
+            file = open(file, 'wb')
+        self.file = file
+        self.forward = forward
+        self.order = None
+        self.seats = {}
+        self.levels = []
+        self.begun = False
+        self.records = bytearray(MAGIC)
+
+    def write(self, kind, a=0, b=0):
+        '''LogWriter.write(kind, a, b) -> None
+        adds a record to the log'''
+        self.records += RECORD.pack(kind, a, b)
+        if len(self.records) >= 1 << 16:
+            self.flush()
+
+    def flush(self):
+        '''LogWriter.flush() -> None
+        writes out the buffered records'''
+        self.file.write(self.records)
+        self.records = bytearray()
+
+    def close(self):
+        '''LogWriter.close() -> None
+        writes out the buffered records and closes the file'''
+        self.flush()
+        self.file.close()
+
+    def begin_game(self, seed=None):
+        '''LogWriter.begin_game(seed) -> None
+        starts a new game in the log, with the seed it was played with'''
+        self.write(GAME)
+        if seed is not None:
+            text = str(seed).encode('utf-8')
+            if len(text) % 2 == 1:
+                text += b'\0'
+            for index in range(0, len(text), 2):
+                self.write(SEED, text[index], text[index + 1])
+        self.begun = True
+
+    def level_number(self, level):
+        '''LogWriter.level_number(level) -> int
+        returns the number of an AI level in the log, counted from 1,
+          naming it in the log if it is not there yet'''
+        if level not in self.levels:
+            if len(self.levels) >= 255:
+                raise ValueError('a game log names at most 255 AI levels')
+            self.levels.append(level)
+            text = level.encode('utf-8') + b'\0'
+            if len(text) % 2 == 1:
+                text += b'\0'
+            for index in range(0, len(text), 2):
+                self.write(NAME, text[index], text[index + 1])
+        return self.levels.index(level) + 1
+
+    def sink(self, event, *args):
+        '''LogWriter.sink(event, *args) -> None
+        the event sink to pass to uno.run_game'''
+        if event == "start":
+            order, pile = args
+            if not self.begun:
+                self.begin_game()
+            self.begun = False
+            self.order = order
+            self.seats = {}
+            self.write(PLAYERS, len(order.players), order.current)
+            for seat in range(len(order.players)):
+                player = order.players[seat]
+                self.seats[id(player)] = seat
+                level = getattr(player, 'aiLevel', None)
+                self.write(LEVEL, seat, 0 if level is None else self.level_number(level))
+                for card in player.hand:
+                    self.write(DEAL, seat, card.code)
+            self.write(TOP, 0, pile.top_code())
+        elif event == "status":
+            self.write(TURN, self.order.current)
+        elif event == "play":
+            player, card, pile = args
+            seat = self.seats[id(player)]
+            self.write(PLAY, seat, card.code)
+            if card.color == "none":
+                self.write(COLOR, seat, uno.COLORS.index(pile.color))
+        elif event == "draw" or event == "penalty":
+            self.write(DRAW if event == "draw" else PENALTY,
+                       self.seats[id(args[0])], args[1].code)
+        elif event == "swap":
+            self.write(SWAP, self.seats[id(args[0])], self.seats[id(args[1])])
+        elif event in ACTION_KINDS:
+            self.write(ACTION_KINDS[event], self.seats[id(args[0])])
+        if self.forward is not None:
+            self.forward(event, *args)
+
+class LogReader:
+    '''reads a binary game log through a memory map
+    attributes:
+      data: the mapped log file
+      count: the number of records
+      games: list of the record number where each game starts
+      levelNames: list of the AI levels named in the log, in order'''
+
+    def __init__(self, path):
+        '''LogReader(path) -> LogReader
+        maps the log at path and finds where its games start'''
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] not in (MAGIC, MAGIC_LEVELS):
+            raise ValueError(path + ' is not an Uno game log')
+        self.count = (len(self.data) - len(MAGIC)) // RECORD.size
+        self.games = self.find(GAME, 0, self.count)
+        if self.data[:len(MAGIC)] == MAGIC_LEVELS:
+            self.levelNames = list(uno.AI_LEVELS)
+        else:
+            text = b''.join(self.data[len(MAGIC) + number * RECORD.size + 1:
+                                      len(MAGIC) + (number + 1) * RECORD.size]
+                            for number in self.find(NAME, 0, self.count))
+            self.levelNames = [name.decode('utf-8') for name in text.split(b'\0') if name]
+
+    def __len__(self):
+        '''len(LogReader) -> int
+        returns the number of games in the log'''
+        return len(self.games)
+
+    def close(self):
+        '''LogReader.close() -> None
+        unmaps the log'''
+        self.data.close()
+        self.file.close()
+
+    def find(self, kind, start, stop):
+        '''LogReader.find(kind, start, stop) -> list
+        returns the numbers of the records of a kind between start and stop'''
+        #... searched in the mapped file, without copying it: each match is
+        #... anchored at a record and skips whole records up to one of the
+        #... kind, so the bytes a and b are never taken for a kind
+        pattern = re.compile(b'(?s)(?:[^' + re.escape(bytes([kind])) + b']..)*'
+                             + re.escape(bytes([kind])) + b'..')
+        offset = len(MAGIC)
+        position = offset + start * RECORD.size
+        end = offset + stop * RECORD.size
+        numbers = []
+        while True:
+            match = pattern.match(self.data, position, end)
+            if match is None:
+                return numbers
+            position = match.end()
+            numbers.append((position - offset) // RECORD.size - 1)
+
+    def game_span(self, game):
+        '''LogReader.game_span(game) -> (int, int)
+        returns the first record number of a game and the one after its last'''
+        start = self.games[game]
+        if game + 1 < len(self.games):
+            return start, self.games[game + 1]
+        return start, self.count
+
+    def record(self, number):
+        '''LogReader.record(number) -> (int, int, int)
+        returns record number as (kind, a, b)'''
+        return RECORD.unpack_from(self.data, len(MAGIC) + number * RECORD.size)
+
+    def records(self, game, start=None, stop=None):
+        '''LogReader.records(game) -> iterator
+        yields the (kind, a, b) records of a game'''
+        first, last = self.game_span(game)
+        if start is None:
+            start = first
+        if stop is None:
+            stop = last
+        offset = len(MAGIC)
+        return RECORD.iter_unpack(self.data[offset + start * RECORD.size:
+                                            offset + stop * RECORD.size])
+
+    def events(self, game):
+        '''LogReader.events(game) -> iterator
+        yields the records of a game with their kind named'''
+        for kind, a, b in self.records(game):
+            yield KIND_NAMES[kind], a, b
+
+    def seed(self, game):
+        '''LogReader.seed(game) -> str
+        returns the seed the game was played with, None if not logged'''
+        text = b''
+        for kind, a, b in self.records(game):
+            if kind == SEED:
+                text += bytes([a, b])
+            elif kind != GAME:
+                break
+        if len(text) == 0:
+            return None
+        return text.rstrip(b'\0').decode('utf-8')
+
+    def levels(self, game):
+        '''LogReader.levels(game) -> list
+        returns the AI level of each seat of a game, None for a person'''
+        levels = []
+        for kind, a, b in self.records(game):
+            if kind == LEVEL:
+                levels.append(None if b == 0 else self.levelNames[b - 1])
+            elif kind == TOP:
+                break
+        return levels
+
+    def turns(self, game):
+        '''LogReader.turns(game) -> list
+        returns the record number where each turn of the game starts'''
+        start, stop = self.game_span(game)
+        return self.find(TURN, start, stop)
+
+    def winner(self, game):
+        '''LogReader.winner(game) -> int
+        returns the seat that won the game, None if it did not finish'''
+        start, stop = self.game_span(game)
+        wins = self.find(WIN, start, stop)
+        if len(wins) == 0:
+            return None
+        return self.record(wins[0])[1]
+
+    def state_at(self, game, turn):
+        '''LogReader.state_at(game, turn) -> dict
+        rebuilds the position at the start of turn number turn (from 0)
+          from the records, without playing the game again
+        returns a dict with the hands (lists of card codes by seat),
+          the top card code, the color to match, the action still to
+          apply, the cards stacked under it still to draw (see
+          uno.Rules.stacking), the seat to play and the direction of play'''
+        start, stop = self.game_span(game)
+        turnStarts = self.find(TURN, start, stop)
+        if turn < len(turnStarts):
+            stop = turnStarts[turn] + 1
+        state = {'hands': [], 'top': None, 'color': None, 'action': 'none',
+                 'penalty': 0, 'current': None, 'direction': 1}
+        hands = state['hands']
+        for kind, a, b in self.records(game, start, stop):
+            if kind == PLAYERS:
+                hands.extend([] for seat in range(a))
+                state['current'] = b
+            elif kind == DEAL or kind == DRAW or kind == PENALTY:
+                hands[a].append(b)
+            elif kind == TOP or kind == PLAY:
+                if kind == PLAY:
+                    hands[a].remove(b)
+                state['top'] = b
+                state['color'] = uno.code_color(b)
+                state['action'] = uno.UnoCard(uno.code_rank(b), uno.code_color(b)).action
+            elif kind == COLOR:
+                state['color'] = uno.COLORS[b]
+            elif kind == TURN:
+                state['current'] = a
+            elif kind == SKIP or kind == DRAWTWO or kind == DRAWFOUR or kind == REVERSE:
+                state['action'] = 'none'
+                state['penalty'] = 0
+                if kind == REVERSE:
+                    state['direction'] = -state['direction']
+            elif kind == STACK:
+                #... the cards owed for the card on top, before it is covered
+                state['penalty'] += 2 if state['action'] == 'drawtwo' else 4
+            elif kind == SWAP:
+                hands[a], hands[b] = hands[b], hands[a]
+            elif kind == ROTATE:
+                direction = state['direction']
+                hands[:] = [hands[(seat - direction) % len(hands)] for seat in range(len(hands))]
+            elif kind == JUMPIN:
+                state['current'] = a
+        if state['action'] == 'wild':
+            state['action'] = 'none'
+        return state
+
+def record_games(path, n, aiLevels, seed=None, maxTurns=10000, rules=None):
+    '''record_games(path, n, aiLevels, seed) -> list
+    plays n games as uno.simulate_games and logs them to path,
+      under rules, the standard ones if not given
+    returns the list of result dicts'''
+    writer = LogWriter(path)
+    results = []
+    for index in range(n):
+        if seed is None:
+            gameSeed = None
+            rng = random.Random()
+        else:
+            gameSeed = uno.game_seed(seed, index)
+            rng = random.Random(gameSeed)
+        writer.begin_game(gameSeed)
+        results.append(uno.simulate_game(aiLevels, rng, writer.sink, maxTurns, rules=rules))
+    writer.close()
+    return results
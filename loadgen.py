@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load generator for the Uno server
+
+Opens many connections to a running server (see server.py): each plays
+games in a row at its own table against computers, answering every
+question with a random option. Idle connections can be added that sit at
+tables waiting for a second player, to see how many idle tables a server
+process holds.
+
+run with: python loadgen.py --clients 200 --games 5 --idle 1000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+async def play_client(host, port, number, games, levels, rng):
+    '''play_client(host, port, number, games, levels, rng) -> int
+    plays games in a row at tables of its own, returns the games finished'''
+    reader, writer = await asyncio.open_connection(host, port)
+    finished = 0
+    try:
+        for game in range(games):
+            writer.write(('JOIN load%d-%d bot%d 1 %s\n' % (number, game, number, levels)).encode())
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return finished
+                words = line.decode().split(' ', 2)
+                if words[0] == 'ASK':
+                    options = words[2].strip().split(';')
+                    writer.write(('MOVE %d\n' % rng.randrange(1, len(options) + 1)).encode())
+                elif words[0] == 'WIN':
+                    finished += 1
+                    break
+                elif words[0] == 'ERROR':
+                    raise RuntimeError(line.decode().strip())
+        writer.write(b'QUIT\n')
+    finally:
+        writer.close()
+    return finished
+
+async def idle_client(host, port, number, stop):
+    '''idle_client(host, port, number, stop) -> None
+    sits at a table waiting for a second player until stop is set'''
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(('JOIN idle%d sleeper%d 2 -\n' % (number, number)).encode())
+    await reader.readline()
+    await stop.wait()
+    writer.close()
+
+async def run_load(host, port, clients, games, idle, levels, seed):
+    '''run_load(host, port, clients, games, idle, levels, seed) -> None
+    runs the load and prints the throughput'''
+    rng = random.Random(seed)
+    stop = asyncio.Event()
+    sleepers = [asyncio.ensure_future(idle_client(host, port, number, stop))
+                for number in range(idle)]
+    start = time.perf_counter()
+    counts = await asyncio.gather(*[play_client(host, port, number, games, levels, rng)
+                                    for number in range(clients)])
+    seconds = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*sleepers)
+    print('%d games in %.2f s: %.1f games/sec with %d idle tables'
+          % (sum(counts), seconds, sum(counts) / seconds, idle))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load generator for the Uno server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--clients', type=int, default=100,
+                        help='connections playing games at the same time')
+    parser.add_argument('--games', type=int, default=10,
+                        help='games played by each connection')
+    parser.add_argument('--idle', type=int, default=0,
+                        help='connections waiting at tables that never fill')
+    parser.add_argument('--levels', default='3,3',
+                        help='AI levels of the computers at each table')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.clients, args.games,
+                         args.idle, args.levels, args.seed))
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-turn timings and counters of Uno games
+
+A Metrics object is passed to uno.play_game (or run_game, simulate_games,
+play_uno) to watch a game. It sits in front of the event sink and wraps a
+few methods of the game's own objects for the length of the game:
+
+  choose_card, choose_color   timed as "decide"
+  acknowledge                 timed as "wait" (a person reading the console)
+  UnoDeck.reset_deck          timed as "reshuffle" when the deck is empty
+  the event sink given        timed as "output"
+
+Each turn runs from one "status" event to the next, what is left once the
+phases above are taken out is "engine" (matching, drawing, the pile and
+the turn order). Without a Metrics object nothing is wrapped and the game
+loop only tests for None once per game.
+
+The results are exported as Prometheus text (for the node exporter's
+textfile collector) or appended to a file as JSON lines.
+
+run with: python metrics.py --games 1000 --out uno.prom
+"""
+
+import argparse
+import bisect
+import json
+import os
+import time
+
+import uno
+
+#... the phases of a turn, "turn" is the whole of it
+PHASES = ['turn', 'decide', 'wait', 'reshuffle', 'output', 'engine']
+#... upper bounds of the buckets of the timing histograms, in seconds
+TIME_BOUNDS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+               1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+#... upper bounds of the buckets of the turns per game histogram
+TURN_BOUNDS = [10, 25, 50, 100, 250, 500, 1000, 2500, 10000]
+ACTIONS = ['skip', 'reverse', 'drawtwo', 'drawfour']
+#... the methods of the players timed as each phase
+PLAYER_PHASES = [('choose_card', 'decide'), ('choose_color', 'decide'),
+                 ('acknowledge', 'wait')]
+
+class Histogram:
+    '''counts observations in buckets, as a Prometheus histogram
+    attributes:
+      bounds: list of the upper bounds of the buckets
+      counts: list of the observations in each bucket, the last
+        one for those above every bound
+      sum: the total of the observations
+      count: the number of observations'''
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        '''Histogram.observe(value) -> None
+        adds an observation'''
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        '''Histogram.cumulative() -> list
+        returns the observations at or below each bound, then all of them'''
+        total = 0
+        counts = []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+class Metrics:
+    '''collects the timings and counters of the games it watches
+    attributes:
+      games, unfinished, turns, drawn, reshuffles: ints, counters
+      actions: dict of the action cards applied, by action
+      phases: dict of a Histogram of seconds per phase (see PHASES)
+      turnsPerGame: Histogram of the turns of each game'''
+
+    def __init__(self):
+        self.games = 0
+        self.unfinished = 0
+        self.turns = 0
+        self.drawn = 0
+        self.reshuffles = 0
+        self.actions = dict((action, 0) for action in ACTIONS)
+        self.phases = dict((phase, Histogram(TIME_BOUNDS)) for phase in PHASES)
+        self.turnsPerGame = Histogram(TURN_BOUNDS)
+        #... seconds spent in each phase during the turn being played
+        self.spent = dict((phase, 0.0) for phase in PHASES)
+        self.turnStart = None
+        self.forward = None
+
+    def timed(self, method, phase):
+        '''Metrics.timed(method, phase) -> callable
+        returns method wrapped to add the time it takes to phase'''
+        spent = self.spent
+        clock = time.perf_counter
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return method(*args)
+            finally:
+                spent[phase] += clock() - start
+        return wrapper
+
+    def reshuffle(self, method, deck):
+        '''Metrics.reshuffle(method, deck) -> callable
+        returns UnoDeck.reset_deck wrapped to count and time the reshuffles'''
+        def wrapper(pile):
+            if not deck.is_empty():
+                return method(pile)
+            start = time.perf_counter()
+            method(pile)
+            seconds = time.perf_counter() - start
+            self.reshuffles += 1
+            self.phases['reshuffle'].observe(seconds)
+            self.spent['reshuffle'] += seconds
+        return wrapper
+
+    def instrument(self, state, sink=None):
+        '''Metrics.instrument(state, sink) -> callable
+        wraps the methods of the game's objects for the game and
+          returns the sink to play it with, which passes the events on
+          to sink'''
+        for player in state.order.players:
+            for name, phase in PLAYER_PHASES:
+                setattr(player, name, self.timed(getattr(player, name), phase))
+        state.deck.reset_deck = self.reshuffle(state.deck.reset_deck, state.deck)
+        self.forward = sink
+        self.turnStart = None
+        return self.sink
+
+    def finish(self, state, result):
+        '''Metrics.finish(state, result) -> None
+        counts the game with its result dict and takes the wrappers off'''
+        self.end_turn(time.perf_counter())
+        self.games += 1
+        if result['winner'] is None:
+            self.unfinished += 1
+        self.turnsPerGame.observe(result['turns'])
+        for player in state.order.players:
+            for name, phase in PLAYER_PHASES:
+                vars(player).pop(name, None)
+        vars(state.deck).pop('reset_deck', None)
+        self.forward = None
+
+    def end_turn(self, now):
+        '''Metrics.end_turn(now) -> None
+        observes the phases of the turn that ends at now'''
+        if self.turnStart is None:
+            return
+        spent = self.spent
+        total = now - self.turnStart
+        self.phases['turn'].observe(total)
+        engine = total
+        for phase in ['decide', 'wait', 'output']:
+            self.phases[phase].observe(spent[phase])
+            engine -= spent[phase]
+        #... the reshuffles have been observed as they happened
+        engine -= spent['reshuffle']
+        self.phases['engine'].observe(max(engine, 0.0))
+        for phase in PHASES:
+            spent[phase] = 0.0
+        self.turnStart = None
+
+    def sink(self, event, *args):
+        '''Metrics.sink(event, *args) -> None
+        the event sink of a watched game, counts the events and passes
+          them on'''
+        now = time.perf_counter()
+        if event == "status":
+            self.end_turn(now)
+            self.turnStart = now
+            self.turns += 1
+        elif event == "draw" or event == "penalty":
+            self.drawn += 1
+        elif event in self.actions:
+            self.actions[event] += 1
+        elif event == "win":
+            self.end_turn(now)
+        if self.forward is not None:
+            start = time.perf_counter()
+            self.forward(event, *args)
+            self.spent['output'] += time.perf_counter() - start
+
+    def counters(self):
+        '''Metrics.counters() -> dict
+        returns the counters by name'''
+        return {'games': self.games, 'unfinished': self.unfinished,
+                'turns': self.turns, 'drawn': self.drawn,
+                'reshuffles': self.reshuffles, 'actions': dict(self.actions)}
+
+    def prometheus_text(self):
+        '''Metrics.prometheus_text() -> str
+        returns the metrics in the Prometheus text format'''
+        lines = []
+
+        def counter(name, help, samples):
+            lines.append('# HELP ' + name + ' ' + help)
+            lines.append('# TYPE ' + name + ' counter')
+            for labels, value in samples:
+                lines.append(name + labels + ' ' + str(value))
+
+        def histogram(name, labels, histo):
+            counts = histo.cumulative()
+            for index in range(len(histo.bounds)):
+                lines.append('%s_bucket{%sle="%s"} %d' % (name, labels, repr(histo.bounds[index]),
+                                                           counts[index]))
+            lines.append('%s_bucket{%sle="+Inf"} %d' % (name, labels, counts[-1]))
+            braces = '{' + labels.rstrip(',') + '}' if labels else ''
+            lines.append('%s_sum%s %r' % (name, braces, histo.sum))
+            lines.append('%s_count%s %d' % (name, braces, histo.count))
+
+        counter('uno_games_total', 'Games played.', [('', self.games)])
+        counter('uno_games_unfinished_total', 'Games stopped before anyone won.',
+                [('', self.unfinished)])
+        counter('uno_turns_total', 'Turns played.', [('', self.turns)])
+        counter('uno_cards_drawn_total', 'Cards drawn, penalties included.', [('', self.drawn)])
+        counter('uno_reshuffles_total', 'Times the pile was shuffled back into the deck.',
+                [('', self.reshuffles)])
+        counter('uno_actions_total', 'Action cards applied.',
+                [('{action="' + action + '"}', self.actions[action]) for action in ACTIONS])
+        lines.append('# HELP uno_phase_seconds Time spent per turn in each phase.')
+        lines.append('# TYPE uno_phase_seconds histogram')
+        for phase in PHASES:
+            histogram('uno_phase_seconds', 'phase="' + phase + '",', self.phases[phase])
+        lines.append('# HELP uno_game_turns Turns per game.')
+        lines.append('# TYPE uno_game_turns histogram')
+        histogram('uno_game_turns', '', self.turnsPerGame)
+        return '\n'.join(lines) + '\n'
+
+    def json_line(self):
+        '''Metrics.json_line() -> str
+        returns the metrics as one line of JSON'''
+        record = {'time': time.time(), 'counters': self.counters(), 'histograms': {}}
+        histos = dict(('phase_seconds:' + phase, self.phases[phase]) for phase in PHASES)
+        histos['game_turns'] = self.turnsPerGame
+        for name, histo in histos.items():
+            record['histograms'][name] = {'bounds': histo.bounds, 'counts': histo.counts,
+                                          'sum': histo.sum, 'count': histo.count}
+        return json.dumps(record, sort_keys=True)
+
+    def export(self, path, format='prometheus'):
+        '''Metrics.export(path, format) -> None
+        writes the metrics to path: "prometheus" replaces the file (through
+          a temporary file, so a collector never reads half of it),
+          "json" appends a line to it'''
+        if format == 'prometheus':
+            temporary = path + '.tmp'
+            with open(temporary, 'w') as file:
+                file.write(self.prometheus_text())
+            os.replace(temporary, path)
+        elif format == 'json':
+            with open(path, 'a') as file:
+                file.write(self.json_line() + '\n')
+        else:
+            raise ValueError('unknown metrics format ' + str(format))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Timings and counters of simulated Uno games')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--levels', default='First Choice mode,Action mode,Random mode',
+                        help='AI levels of the seats, separated by commas')
+    parser.add_argument('--seed', default=None)
+    parser.add_argument('--format', choices=['prometheus', 'json'], default='prometheus')
+    parser.add_argument('--out', default=None, help='file to export to (default: print)')
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    uno.simulate_games(args.games, args.levels.split(','), args.seed, metrics=metrics)
+    if args.out is not None:
+        metrics.export(args.out, args.format)
+    elif args.format == 'prometheus':
+        print(metrics.prometheus_text(), end='')
+    else:
+        print(metrics.json_line())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo lookahead for the "Monte Carlo mode" computer level
+
+At each move the computer deals out the cards it can't see (the other
+hands and the deck) at random, tries every card it could play (with each
+color for a wild card) in every deal, and plays the games out to the end
+with "Random mode" players. The move that won most often is played.
+
+The play-outs are played by the game itself, in one GameState of
+"Random mode" computers put back to each deal with GameState.restore, so
+a deal is a snapshot of card codes instead of a deep copy of the UnoDeck,
+UnoPile and UnoPlayer objects. They are played under the standard rules,
+whatever house rules the game has (see uno.Rules).
+"""
+
+import time
+
+import uno
+
+#... turns after which a play-out counts as lost
+ROLLOUT_TURNS = 500
+#... deals per round when searching against the clock
+ROUND_DEALS = 8
+
+def unseen_codes(player):
+    '''unseen_codes(player) -> list
+    returns the codes of the cards the player can't see: the deck
+      and the hands of the other players'''
+    #... counted by code, whatever the deck the game is played with
+    counts = [0] * uno.NUM_CODES
+    for card in player.deck.deck:
+        counts[card.code] += 1
+    for other in player.order.players:
+        if other is not player:
+            for card in other.hand:
+                counts[card.code] += 1
+    unseen = []
+    for code in range(uno.NUM_CODES):
+        unseen += [code] * counts[code]
+    return unseen
+
+def determinize(player, unseen, rng):
+    '''determinize(player, unseen, rng) -> tuple
+    returns a snapshot of the game (see uno.GameState.snapshot) where
+      the unseen cards have been dealt at random to the other players
+      and the deck'''
+    order = player.order
+    cards = list(unseen)
+    rng.shuffle(cards)
+    hands = []
+    for other in order.players:
+        if other is player:
+            hands.append(bytes([card.code for card in player.hand]))
+        else:
+            count = min(len(other.hand), len(cards))
+            hands.append(bytes(cards[len(cards) - count:]))
+            del cards[len(cards) - count:]
+    pile = player.pile
+    return (bytes(cards), bytes([card.code for card in pile.pile]), tuple(hands),
+            (0,) * len(hands), pile.color, "none", 0, order.current, order.direction, 0)
+
+def apply_move(snapshot, seat, code, color):
+    '''apply_move(snapshot, seat, code, color) -> tuple
+    returns the snapshot after seat, the player to move, plays the card
+      code, color is the index of the color chosen for a wild card'''
+    deckCodes, pileCodes, handCodes, drawn, pileColor, action, penalty, \
+        current, direction, turns = snapshot
+    hand = handCodes[seat]
+    index = hand.index(code)
+    hands = handCodes[:seat] + (hand[:index] + hand[index + 1:],) + handCodes[seat + 1:]
+    card = uno.CODE_CARDS[code]
+    return (deckCodes, pileCodes + bytes([code]), hands, drawn,
+            card.color if color is None else uno.COLORS[color], card.action, penalty,
+            (current + direction) % len(hands), direction, turns)
+
+def rollout_state(player):
+    '''rollout_state(player) -> GameState
+    returns a game of "Random mode" computers, as many as at the
+      player's table and deciding with the player's random source, to
+      play the play-outs in'''
+    numPlayers = len(player.order.players)
+    deck = uno.STANDARD_RULES.new_deck(numPlayers, player.rng)
+    pile = uno.UnoPile(deck)
+    players = [uno.UnoComputer('Computer' + str(n + 1), deck, 'Random mode', player.rng)
+               for n in range(numPlayers)]
+    return uno.GameState(players, deck, pile)
+
+def candidate_moves(matches):
+    '''candidate_moves(matches) -> list
+    returns the (card, color index) moves open to the player,
+      color is None for a card that is not wild'''
+    moves = []
+    for card in matches:
+        if any(card is move[0] for move in moves):
+            continue
+        if card.color == "none":
+            for color in range(4):
+                moves.append((card, color))
+        else:
+            moves.append((card, None))
+    return moves
+
+def search(player, matches):
+    '''search(player, matches) -> (UnoCard, str)
+    returns the card the player should play and the color to give it
+      (None for a card that is not wild), within the player's budget
+      of rollouts or timeLimit milliseconds'''
+    moves = candidate_moves(matches)
+    if len(moves) == 1:
+        return matches[0], None
+    seat = player.order.players.index(player)
+    unseen = unseen_codes(player)
+    wins = [0] * len(moves)
+    plays = [0] * len(moves)
+    state = None
+    start = time.perf_counter()
+    while True:
+        if player.timeLimit is None:
+            #... spread the rollouts over the moves, at least one deal each
+            deals = max(1, -(-player.rollouts // len(moves)))
+        else:
+            deals = ROUND_DEALS
+        for n in range(deals):
+            snapshot = determinize(player, unseen, player.rng)
+            for index in range(len(moves)):
+                card, color = moves[index]
+                after = apply_move(snapshot, seat, card.code, color)
+                plays[index] += 1
+                if len(after[2][seat]) == 0:
+                    wins[index] += 1
+                    continue
+                if state is None:
+                    state = rollout_state(player)
+                state.restore(after)
+                if uno.play_game(state, maxTurns=ROLLOUT_TURNS)['seat'] == seat:
+                    wins[index] += 1
+        if player.timeLimit is None:
+            break
+        if (time.perf_counter() - start) * 1000 >= player.timeLimit:
+            break
+    best = 0
+    for index in range(len(moves)):
+        if wins[index] * plays[best] > wins[best] * plays[index]:
+            best = index
+    card, color = moves[best]
+    return card, None if color is None else uno.COLORS[color]
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar store of game results
+
+A store is a directory with one file per column, each a flat array of
+fixed-size little-endian numbers (see array.array), and meta.json:
+
+  run       i   the run the game belongs to, meta.json has its seed
+  game      q   the number of the game in its run (see uno.game_seed)
+  seats     B   the number of players
+  offset    q   where the game's seats start in the levels column
+  winner    B   the seat that won, NOBODY if the game was stopped
+  winlevel  B   the AI level of the winner, NOBODY if the game was stopped
+  turns     i   the turns played
+  drawn     i   the cards drawn
+  actions   i   the action cards applied (skip, reverse, drawtwo, drawfour)
+  levels    B   the AI level of each seat of each game, one row per seat
+
+AI levels are numbered by their place in the list of levels of
+meta.json, which starts as uno.AI_LEVELS and grows with the levels of
+the games added. The writer appends to the files a chunk at a time, and
+cuts off any rows past those of meta.json when it opens the store: the
+rows of a chunk whose writing was interrupted. The reader maps the files
+and answers its queries by counting byte values a chunk of a column
+at a time, without turning the rows into Python objects; meta.json
+keeps the total of the turns.
+
+run with: python results.py results/ --games 10000 --seed 1
+"""
+
+import argparse
+from array import array
+import json
+import mmap
+import os
+import random
+import sys
+
+import tournament
+import uno
+
+META = 'meta.json'
+COLUMNS = [('run', 'i'), ('game', 'q'), ('seats', 'B'), ('offset', 'q'), ('winner', 'B'),
+           ('winlevel', 'B'), ('turns', 'i'), ('drawn', 'i'), ('actions', 'i'), ('levels', 'B')]
+#... the winner of a game that was stopped
+NOBODY = 255
+ACTIONS = ["skip", "reverse", "drawtwo", "drawfour"]
+#... bytes of a column counted at a time
+SCAN_BYTES = 1 << 20
+
+if sys.byteorder != 'little':
+    raise ImportError('the results store is written little-endian')
+
+class ActionCounter:
+    '''an event sink counting the action cards applied in a game'''
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, event, *args):
+        if event in ACTIONS:
+            self.count += 1
+
+class ResultsWriter:
+    '''appends game results to a store, a chunk at a time
+    attributes:
+      path: the directory of the store
+      meta: dict of meta.json: the AI levels, the seeds of the runs,
+        the rows and the turns played
+      columns: dict of the arrays of the rows not written yet
+      chunkSize: rows kept before they are written'''
+
+    def __init__(self, path, chunkSize=65536):
+        '''ResultsWriter(path) -> ResultsWriter
+        opens the store at path to add to it, creating it if needed
+          and dropping the rows written after the last meta.json'''
+        self.path = path
+        self.chunkSize = chunkSize
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        metaPath = os.path.join(path, META)
+        if os.path.exists(metaPath):
+            with open(metaPath) as file:
+                self.meta = json.load(file)
+        else:
+            self.meta = {'levels': list(uno.AI_LEVELS), 'runs': [], 'rows': 0, 'seatRows': 0,
+                         'turns': 0}
+        for name, typecode in COLUMNS:
+            columnPath = os.path.join(path, name)
+            count = self.meta['seatRows'] if name == 'levels' else self.meta['rows']
+            size = count * array(typecode).itemsize
+            if os.path.exists(columnPath) and os.path.getsize(columnPath) > size:
+                os.truncate(columnPath, size)
+        if 'turns' not in self.meta:
+            #... a store written before meta.json kept the total
+            reader = ResultsReader(path)
+            self.meta['turns'] = reader.total('turns')
+            reader.close()
+        self.columns = dict((name, array(typecode)) for name, typecode in COLUMNS)
+        self.run = None
+
+    def begin_run(self, seed=None):
+        '''ResultsWriter.begin_run(seed) -> int
+        starts a run of games played with seed, returns its number'''
+        self.meta['runs'].append(None if seed is None else str(seed))
+        self.run = len(self.meta['runs']) - 1
+        return self.run
+
+    def level_number(self, level):
+        '''ResultsWriter.level_number(level) -> int
+        returns the number of an AI level in the store, adding it to
+          the levels of meta.json if it is not there yet'''
+        levels = self.meta['levels']
+        if level not in levels:
+            if len(levels) >= NOBODY:
+                raise ValueError('a results store holds at most %d AI levels' % NOBODY)
+            levels.append(level)
+        return levels.index(level)
+
+    def add(self, game, aiLevels, result, actions=0):
+        '''ResultsWriter.add(game, aiLevels, result, actions) -> None
+        adds the result dict of game number game of the current run,
+          played by the AI levels aiLevels'''
+        if self.run is None:
+            self.begin_run()
+        columns = self.columns
+        seat = result['seat']
+        columns['run'].append(self.run)
+        columns['game'].append(game)
+        columns['seats'].append(len(aiLevels))
+        columns['offset'].append(self.meta['seatRows'] + len(columns['levels']))
+        columns['winner'].append(NOBODY if seat is None else seat)
+        columns['winlevel'].append(NOBODY if seat is None else self.level_number(aiLevels[seat]))
+        columns['turns'].append(result['turns'])
+        columns['drawn'].append(result['drawn'])
+        columns['actions'].append(actions)
+        columns['levels'].extend([self.level_number(level) for level in aiLevels])
+        if len(columns['run']) >= self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        '''ResultsWriter.flush() -> None
+        appends the rows kept to the column files'''
+        columns = self.columns
+        for name, typecode in COLUMNS:
+            with open(os.path.join(self.path, name), 'ab') as file:
+                columns[name].tofile(file)
+        self.meta['rows'] += len(columns['run'])
+        self.meta['seatRows'] += len(columns['levels'])
+        self.meta['turns'] += sum(columns['turns'])
+        self.columns = dict((name, array(typecode)) for name, typecode in COLUMNS)
+        #... meta.json is replaced in one go, a reader sees the rows before
+        #... or after the chunk
+        temporary = os.path.join(self.path, META + '.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(self.meta, file)
+        os.replace(temporary, os.path.join(self.path, META))
+
+    def close(self):
+        '''ResultsWriter.close() -> None
+        writes out the rows kept'''
+        self.flush()
+
+class ResultsReader:
+    '''reads a store of game results through memory maps
+    attributes:
+      meta: dict of meta.json
+      rows: the number of games in the store'''
+
+    def __init__(self, path):
+        '''ResultsReader(path) -> ResultsReader
+        maps the columns of the store at path'''
+        with open(os.path.join(path, META)) as file:
+            self.meta = json.load(file)
+        self.rows = self.meta['rows']
+        self.files = []
+        self.maps = {}
+        self.views = {}
+        for name, typecode in COLUMNS:
+            file = open(os.path.join(path, name), 'rb')
+            self.files.append(file)
+            size = array(typecode).itemsize
+            count = self.meta['seatRows'] if name == 'levels' else self.rows
+            if count == 0:
+                self.maps[name] = b''
+            else:
+                #... only the rows of meta.json, a writer may be adding more
+                self.maps[name] = mmap.mmap(file.fileno(), count * size, access=mmap.ACCESS_READ)
+            self.views[name] = memoryview(self.maps[name]).cast(typecode)
+
+    def __len__(self):
+        '''len(ResultsReader) -> int
+        returns the number of games in the store'''
+        return self.rows
+
+    def close(self):
+        '''ResultsReader.close() -> None
+        unmaps the columns'''
+        for view in self.views.values():
+            view.release()
+        for data in self.maps.values():
+            if isinstance(data, mmap.mmap):
+                data.close()
+        for file in self.files:
+            file.close()
+
+    def column(self, name):
+        '''ResultsReader.column(name) -> memoryview
+        returns a column as a memoryview of numbers, without copying it'''
+        return self.views[name]
+
+    def row(self, index):
+        '''ResultsReader.row(index) -> dict
+        returns game number index of the store'''
+        views = self.views
+        offset = views['offset'][index]
+        levels = views['levels'][offset:offset + views['seats'][index]]
+        winner = views['winner'][index]
+        seed = self.meta['runs'][views['run'][index]]
+        return {'seed': None if seed is None else uno.game_seed(seed, views['game'][index]),
+                'levels': [self.meta['levels'][level] for level in levels],
+                'seat': None if winner == NOBODY else winner,
+                'turns': views['turns'][index], 'drawn': views['drawn'][index],
+                'actions': views['actions'][index]}
+
+    def counts(self, name):
+        '''ResultsReader.counts(name) -> list
+        returns how many times each byte value appears in a one byte
+          column, NOBODY and the values up to the largest other'''
+        data = self.maps[name]
+        counts = [0] * (NOBODY + 1)
+        for start in range(0, len(data), SCAN_BYTES):
+            chunk = data[start:start + SCAN_BYTES]
+            #... one pass in C per value that can be there
+            for value in range(max(chunk.translate(None, bytes([NOBODY])), default=-1) + 1):
+                counts[value] += chunk.count(value)
+            counts[NOBODY] += chunk.count(NOBODY)
+        return counts
+
+    def total(self, name):
+        '''ResultsReader.total(name) -> int
+        returns the sum of a column, a chunk of it at a time'''
+        view = self.views[name]
+        step = SCAN_BYTES // view.itemsize
+        return sum(sum(view[start:start + step].tolist()) for start in range(0, len(view), step))
+
+    def level_table(self):
+        '''ResultsReader.level_table() -> dict
+        returns the results table of the store by AI level, as
+          tournament.new_table: a level seated twice in a game plays twice'''
+        played = self.counts('levels')
+        won = self.counts('winlevel')
+        names = self.meta['levels']
+        table = tournament.new_table([names[level] for level in range(len(names))
+                                      if played[level] > 0])
+        table['games'] = self.rows
+        table['unfinished'] = won[NOBODY]
+        table['turns'] = self.meta['turns'] if 'turns' in self.meta else self.total('turns')
+        for level in range(len(names)):
+            if played[level] > 0:
+                table['levels'][names[level]] = {'games': played[level], 'wins': won[level]}
+        return table
+
+    def seat_table(self):
+        '''ResultsReader.seat_table() -> dict
+        returns the games played and won from each seat, as a dict of
+          {'games', 'wins'} by seat number'''
+        tables = self.counts('seats')
+        won = self.counts('winner')
+        seats = {}
+        games = 0
+        #... every table of more than seat players has that seat
+        for seat in range(NOBODY - 1, -1, -1):
+            games += tables[seat + 1]
+            if games > 0:
+                seats[seat] = {'games': games, 'wins': won[seat]}
+        return dict(sorted(seats.items()))
+
+def record_games(path, n, aiLevels, seed=None, maxTurns=10000, rules=None, rotate=False):
+    '''record_games(path, n, aiLevels, seed) -> None
+    plays n games as uno.simulate_games and adds their results to the
+      store at path, rotate moves the levels one seat per game'''
+    writer = ResultsWriter(path)
+    writer.begin_run(seed)
+    for index in range(n):
+        if seed is None:
+            rng = random.Random()
+        else:
+            rng = random.Random(uno.game_seed(seed, index))
+        levels = tournament.seating(aiLevels, index, rotate)
+        counter = ActionCounter()
+        result = uno.simulate_game(levels, rng, counter, maxTurns, rules=rules)
+        writer.add(index, levels, result, counter.count)
+    writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Store of Uno game results')
+    parser.add_argument('path', help='directory of the store')
+    parser.add_argument('--games', type=int, default=0, help='games to play and add first')
+    parser.add_argument('--levels', default='First Choice mode,Action mode,Random mode',
+                        help='AI levels of the seats, separated by commas')
+    parser.add_argument('--seed', default=None)
+    parser.add_argument('--rotate', action='store_true', help='move the levels one seat per game')
+    args = parser.parse_args()
+
+    if args.games > 0:
+        record_games(args.path, args.games, args.levels.split(','), args.seed, rotate=args.rotate)
+    reader = ResultsReader(args.path)
+    print(tournament.format_table(reader.level_table()), end='')
+    for seat, counts in reader.seat_table().items():
+        print('seat %-3d %8d wins %8d games %7.2f%%' % (
+            seat, counts['wins'], counts['games'], 100 * counts['wins'] / counts['games']))
+    reader.close()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asyncio server hosting many Uno tables at once
+
+Clients talk to the server over TCP, one line per message.
+
+  client -> server
+    JOIN <table> <name> <people> <levels>
+        sits at the table, creating it if needed: people is the number
+        of remote players it waits for, levels the AI levels of its
+        computers as numbers of uno.AI_LEVELS counted from 1, separated
+        by commas ("-" for none), MAX_SEATS players at most; the game
+        starts when it is full
+    MOVE <n>
+        answers the last question with option n (counted from 1)
+    QUIT
+  server -> client
+    SEATED <table> <seat>       START <players>
+    TURN <name> <top card>      PLAY <name> <card>
+    DRAW <name>                 DREW <card> (to the player who drew it)
+    SKIP / REVERSE / DRAWTWO / DRAWFOUR / NODRAW <name>
+    HAND <card>;<card>;...      ASK <card|color|player> <option>;<option>;...
+    TIMEOUT                     WIN <name>              ERROR <message>
+
+Each table is a coroutine running uno.play_turn, in a thread for the
+computers that search (see uno.Strategy.compact). A remote player who has
+not answered yet raises NeedMove from inside the turn: the table puts the
+game back as it was before the turn (GameState.snapshot and the random
+state), awaits the answer with a timeout and plays the turn again. A
+table waiting for players or for a move costs no more than its game state.
+
+run with: python server.py --port 7777
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import random
+
+import uno
+
+#... the most players at a table, remote ones and computers
+MAX_SEATS = 20
+
+class NeedMove(Exception):
+    '''raised by a RemotePlayer asked a question it has no answer for yet'''
+
+    def __init__(self, player, question, options, hand):
+        Exception.__init__(self, question)
+        self.player = player
+        self.question = question
+        self.options = options
+        self.hand = hand
+
+class RemotePlayer(uno.UnoPlayer):
+    '''represents a player of Uno connected to the server
+    attributes:
+      name: a string with the player's name
+      hand: an UnoHand of UnoCards
+      client: the Client the player plays through
+      answers: list of the answers received for the turn being played'''
+
+    def __init__(self, name, deck, client):
+        uno.UnoPlayer.__init__(self, name, deck)
+        self.client = client
+        self.answers = []
+        self.cursor = 0
+
+    def default_sink(self):
+        '''RemotePlayer.default_sink() -> None
+        the table sends the events to the client'''
+        return None
+
+    def acknowledge(self, prompt="Press enter to continue."):
+        '''RemotePlayer.acknowledge(prompt) -> None
+        the remote player reads the messages at their own pace'''
+        pass
+
+    def answer(self, question, options):
+        '''RemotePlayer.answer(question, options) -> int
+        returns the next answer received for this turn,
+          raises NeedMove if there is none yet'''
+        if self.cursor < len(self.answers):
+            self.cursor += 1
+            return self.answers[self.cursor - 1]
+        raise NeedMove(self, question, options, [str(card) for card in self.hand])
+
+    def choose_card(self, matches):
+        '''RemotePlayer.choose_card(matches) -> int'''
+        return self.answer('card', [str(card) for card in matches])
+
+    def choose_color(self, icolor):
+        '''RemotePlayer.choose_color(icolor) -> int'''
+        return self.answer('color', icolor)
+
+    def choose_player(self, others):
+        '''RemotePlayer.choose_player(others) -> int'''
+        return self.answer('player', [other.name for other in others])
+
+    def take_turn(self, deck, pile, sink=None):
+        '''RemotePlayer.take_turn(deck, pile) -> None
+        takes the turn with the answers received so far'''
+        self.cursor = 0
+        uno.UnoPlayer.take_turn(self, deck, pile, sink)
+        self.answers = []
+
+class Client:
+    '''represents a connection to the server
+    attributes:
+      reader, writer: the asyncio streams of the connection
+      moves: queue of the MOVE answers received
+      table: the Table the client sits at, None if it sits nowhere
+      connected: False once the connection has closed'''
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.moves = asyncio.Queue(maxsize=4)
+        self.table = None
+        self.connected = True
+
+    def send(self, line):
+        '''Client.send(line) -> None
+        queues a line for the client'''
+        if self.connected:
+            self.writer.write(line.encode('utf-8') + b'\n')
+
+    async def flush(self):
+        '''Client.flush() -> None
+        waits until the lines sent so far have gone out'''
+        if self.connected:
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                self.connected = False
+
+class Table:
+    '''represents a table of the server
+    attributes:
+      name: the table's name
+      people: the number of remote players the table waits for
+      aiLevels: list of the AI levels of the computers
+      clients: list of the clients seated so far
+      state: the GameState once the game has started
+      pending: list of the lines of the turn being played'''
+
+    def __init__(self, server, name, people, aiLevels):
+        self.server = server
+        self.name = name
+        self.people = people
+        self.aiLevels = aiLevels
+        self.clients = []
+        self.state = None
+        self.rng = random.Random()
+        self.pending = []
+
+    def broadcast(self, line, owner=None, private=None):
+        '''Table.broadcast(line) -> None
+        sends a line to every client, owner gets private instead if given'''
+        for client in self.clients:
+            if owner is not None and client is owner:
+                client.send(private)
+            else:
+                client.send(line)
+
+    def flush_events(self):
+        '''Table.flush_events() -> None
+        sends the lines of the turn just played'''
+        for line, owner, private in self.pending:
+            self.broadcast(line, owner, private)
+        self.pending = []
+
+    def sink(self, event, *args):
+        '''Table.sink(event, *args) -> None
+        the event sink of the table's game, keeps the events as lines
+          until the turn is over'''
+        if event == "start":
+            self.pending.append(('START ' + str(len(args[0].players)), None, None))
+        elif event == "turn":
+            player, pile = args
+            self.pending.append(('TURN ' + player.name + ' '
+                                 + uno.CARD_TEXTS[pile.top_code()], None, None))
+        elif event == "play":
+            player, card, pile = args
+            self.pending.append(('PLAY ' + player.name + ' '
+                                 + uno.CARD_TEXTS[pile.top_code()], None, None))
+        elif event == "draw" or event == "penalty":
+            player, card = args[0], args[1]
+            self.pending.append(('DRAW ' + player.name, getattr(player, 'client', None),
+                                 'DREW ' + str(card)))
+        elif event in ["skip", "reverse", "drawtwo", "drawfour", "nodraw"]:
+            self.pending.append((event.upper() + ' ' + args[0].name, None, None))
+
+    async def ask(self, need):
+        '''Table.ask(need) -> int
+        asks a remote player the question of a NeedMove and returns
+          the answer, the first option if none comes in time'''
+        client = need.player.client
+        if client.connected:
+            client.send('HAND ' + ';'.join(need.hand))
+            client.send('ASK ' + need.question + ' ' + ';'.join(need.options))
+            await client.flush()
+            try:
+                while True:
+                    choice = await asyncio.wait_for(client.moves.get(), self.server.moveTimeout)
+                    if 1 <= choice <= len(need.options):
+                        return choice
+                    client.send('ERROR choose 1 to ' + str(len(need.options)))
+            except asyncio.TimeoutError:
+                client.send('TIMEOUT')
+        return 1
+
+    async def play(self):
+        '''Table.play() -> None
+        plays the table's game, then frees the table, telling the
+          clients if the game failed'''
+        try:
+            await self.play_game()
+        except Exception as error:
+            self.broadcast('ERROR the game at table ' + self.name + ' stopped: '
+                           + type(error).__name__)
+            raise
+        finally:
+            for client in self.clients:
+                await client.flush()
+                client.table = None
+            if self.server.tables.get(self.name) is self:
+                del self.server.tables[self.name]
+
+    async def play_game(self):
+        '''Table.play_game() -> None
+        plays the table's game, one turn at a time'''
+        rng = self.rng
+        numPlayers = len(self.clients) + len(self.aiLevels)
+        #... a shoe of several decks when one can't deal every hand
+        deck = uno.STANDARD_RULES.new_deck(numPlayers, rng)
+        pile = uno.UnoPile(deck)
+        players = []
+        for client in self.clients:
+            players.append(RemotePlayer(client.name, deck, client))
+        for index in range(len(self.aiLevels)):
+            players.append(uno.UnoComputer('Computer' + str(index + 1), deck,
+                                           self.aiLevels[index], rng))
+        self.state = uno.GameState(players, deck, pile, rng.randrange(len(players)))
+        uno.start_game(self.state, self.sink)
+        winner = None
+        while winner is None and self.state.turns < self.server.maxTurns:
+            snapshot = self.state.snapshot()
+            rngState = rng.getstate()
+            player = self.state.order.current_player()
+            try:
+                if isinstance(player, uno.UnoComputer) and not player.strategy.compact:
+                    #... a searching computer thinks in the server's search
+                    #... thread, the other tables play meanwhile
+                    winner = await asyncio.get_running_loop().run_in_executor(
+                        self.server.searches, uno.play_turn, self.state, self.sink)
+                else:
+                    winner = uno.play_turn(self.state, self.sink)
+            except NeedMove as need:
+                #... nothing of the unfinished turn has been sent:
+                #... the events go out once the turn is over
+                self.state.restore(snapshot)
+                rng.setstate(rngState)
+                self.pending = []
+                need.player.answers.append(await self.ask(need))
+                continue
+            self.flush_events()
+            for client in self.clients:
+                await client.flush()
+            #... let the other tables play
+            await asyncio.sleep(0)
+        if winner is not None:
+            self.broadcast('WIN ' + winner.name)
+        self.server.games += 1
+
+class Server:
+    '''represents the Uno server
+    attributes:
+      tables: dict of the open tables by name
+      moveTimeout: seconds a remote player has to answer
+      maxTurns: turns after which a game is stopped
+      games: the number of games played
+      searches: the executor playing the turns of the computers whose
+        strategy is not compact, one at a time as they share the
+        endgame solver'''
+
+    def __init__(self, moveTimeout=30.0, maxTurns=10000):
+        self.tables = {}
+        self.searches = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.moveTimeout = moveTimeout
+        self.maxTurns = maxTurns
+        self.games = 0
+        self.tasks = set()
+
+    def join(self, client, words):
+        '''Server.join(client, words) -> None
+        seats a client at the table of a JOIN message'''
+        if len(words) != 5 or not words[3].isdigit():
+            client.send('ERROR usage: JOIN <table> <name> <people> <levels>')
+            return
+        tableName, name, people = words[1], words[2], int(words[3])
+        aiLevels = []
+        if words[4] != '-':
+            for number in words[4].split(','):
+                if not number.isdigit() or not 1 <= int(number) <= len(uno.AI_LEVELS):
+                    client.send('ERROR unknown AI level ' + number)
+                    return
+                aiLevels.append(uno.AI_LEVELS[int(number) - 1])
+        if people < 1 or people + len(aiLevels) < 2:
+            client.send('ERROR a table needs a remote player and two players')
+            return
+        if people + len(aiLevels) > MAX_SEATS:
+            client.send('ERROR a table has at most ' + str(MAX_SEATS) + ' players')
+            return
+        table = self.tables.get(tableName)
+        if table is None:
+            table = Table(self, tableName, people, aiLevels)
+            self.tables[tableName] = table
+        elif table.state is not None or len(table.clients) >= table.people:
+            client.send('ERROR table ' + tableName + ' is full')
+            return
+        client.name = name
+        client.table = table
+        table.clients.append(client)
+        client.send('SEATED ' + tableName + ' ' + str(len(table.clients) - 1))
+        if len(table.clients) == table.people:
+            task = asyncio.ensure_future(table.play())
+            self.tasks.add(task)
+            task.add_done_callback(self.finished)
+
+    def finished(self, task):
+        '''Server.finished(task) -> None
+        forgets the task of a table once its game is over, reporting
+          the error it stopped with if any'''
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            print('table stopped by ' + type(error).__name__ + ': ' + str(error))
+
+    def leave(self, client):
+        '''Server.leave(client) -> None
+        frees the seat of a client whose connection has closed'''
+        client.connected = False
+        table = client.table
+        if table is not None and table.state is None:
+            #... the game has not started, give the seat back
+            table.clients.remove(client)
+            if len(table.clients) == 0:
+                del self.tables[table.name]
+
+    async def handle(self, reader, writer):
+        '''Server.handle(reader, writer) -> None
+        reads the messages of a client until it leaves'''
+        client = Client(reader, writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode('utf-8', 'replace').split()
+                if len(words) == 0:
+                    continue
+                command = words[0].upper()
+                if command == 'JOIN':
+                    if client.table is not None:
+                        client.send('ERROR already seated')
+                    else:
+                        self.join(client, words)
+                elif command == 'MOVE' and len(words) == 2 and words[1].isdigit():
+                    if client.moves.full():
+                        client.send('ERROR too many moves')
+                    else:
+                        client.moves.put_nowait(int(words[1]))
+                elif command == 'QUIT':
+                    break
+                else:
+                    client.send('ERROR unknown message')
+                await client.flush()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(client)
+            writer.close()
+
+async def serve(host='127.0.0.1', port=7777, moveTimeout=30.0):
+    '''serve(host, port) -> None
+    runs an Uno server until it is cancelled'''
+    server = Server(moveTimeout)
+    listener = await asyncio.start_server(server.handle, host, port)
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Uno game server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds a player has to answer')
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.timeout))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tournaments between computer players, spread over all cores
+
+Every game gets its own random stream from the master seed and its
+game number (see uno.game_seed), so a tournament gives the same table
+for the same seed whatever the number of workers.
+"""
+
+import multiprocessing
+import random
+
+import uno
+
+def seating(roster, index, rotate=True):
+    '''seating(roster, index) -> list
+    returns the AI level of each seat for game number index,
+      the roster is rotated one seat per game so no level keeps the first seat'''
+    if not rotate:
+        return list(roster)
+    shift = index % len(roster)
+    return list(roster[shift:]) + list(roster[:shift])
+
+def new_table(roster):
+    '''new_table(roster) -> dict
+    returns an empty results table for the AI levels in roster'''
+    table = {'games': 0, 'unfinished': 0, 'turns': 0, 'levels': {}}
+    for level in roster:
+        table['levels'][level] = {'games': 0, 'wins': 0}
+    return table
+
+def merge_tables(tables):
+    '''merge_tables(tables) -> dict
+    adds up a list of results tables into one'''
+    merged = None
+    for table in tables:
+        if merged is None:
+            merged = new_table(list(table['levels']))
+        for key in ['games', 'unfinished', 'turns']:
+            merged[key] += table[key]
+        for level, counts in table['levels'].items():
+            merged['levels'][level]['games'] += counts['games']
+            merged['levels'][level]['wins'] += counts['wins']
+    return merged
+
+def play_chunk(job):
+    '''play_chunk(job) -> dict
+    plays games start to stop of a tournament and returns their table,
+      job is a tuple (roster, seed, start, stop, rotate, maxTurns)'''
+    roster, seed, start, stop, rotate, maxTurns = job
+    table = new_table(roster)
+    for index in range(start, stop):
+        aiLevels = seating(roster, index, rotate)
+        rng = random.Random(uno.game_seed(seed, index))
+        result = uno.simulate_game(aiLevels, rng, None, maxTurns)
+        table['games'] += 1
+        table['turns'] += result['turns']
+        #... a level seated twice plays twice in the same game
+        for level in aiLevels:
+            table['levels'][level]['games'] += 1
+        if result['winner'] is None:
+            table['unfinished'] += 1
+        else:
+            table['levels'][aiLevels[result['seat']]]['wins'] += 1
+    return table
+
+def run_tournament(roster, numGames, seed=0, workers=None, rotate=True,
+                   chunkSize=1000, maxTurns=10000):
+    '''run_tournament(roster, numGames, seed) -> dict
+    plays numGames games between computers with the AI levels in roster
+      workers is the number of processes, all cores if not given
+      rotate moves the roster one seat per game
+      chunkSize is the number of games handed to a worker at a time
+    returns the merged results table (see win_rates)'''
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    jobs = [(list(roster), seed, start, min(start + chunkSize, numGames),
+             rotate, maxTurns)
+            for start in range(0, numGames, chunkSize)]
+    if workers <= 1 or len(jobs) <= 1:
+        tables = [play_chunk(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            tables = pool.map(play_chunk, jobs)
+    if len(tables) == 0:
+        return new_table(roster)
+    return merge_tables(tables)
+
+def win_rates(table):
+    '''win_rates(table) -> dict
+    returns the share of the games won by each AI level'''
+    rates = {}
+    for level, counts in table['levels'].items():
+        if counts['games'] == 0:
+            rates[level] = 0.0
+        else:
+            rates[level] = counts['wins'] / counts['games']
+    return rates
+
+def format_table(table):
+    '''format_table(table) -> str
+    returns a printable win-rate table'''
+    output = str(table['games']) + ' games, ' + str(table['unfinished']) + ' unfinished\n'
+    rates = win_rates(table)
+    for level, counts in table['levels'].items():
+        output += '%-20s %8d wins %8d games %7.2f%%\n' % (
+            level, counts['wins'], counts['games'], 100 * rates[level])
+    return output
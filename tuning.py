@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paired comparisons of AI strategies, stopped as soon as one is better
+
+A candidate strategy and a baseline take turns in the same seat against
+the same opponents. Game i is played twice from the same seed (see
+uno.game_seed), once with each of them, so both get the same deal and
+the same first player: the luck of the deal cancels out of the
+difference. The deck and each seat have their own random stream, so
+the two games stay alike for as long as the decisions do. Only the
+pairs where one won and the other did not tell them apart, and a
+sequential probability ratio test on those pairs stops the run once
+either is ahead by more than chance allows, or once neither can be.
+
+The seat of the candidate moves one place per game. Games are played in
+chunks on all cores, and the test takes the chunks in game order, so a
+comparison stops after the same games, with the same result, whatever
+the number of workers.
+
+run with: python tuning.py --candidate "heuristic:mostColor=1" --baseline "Action mode"
+"""
+
+import argparse
+import math
+import multiprocessing
+import random
+
+import uno
+
+class Heuristic(uno.Strategy):
+    '''a tunable "Action mode"
+    attributes:
+      actionRate: the chance of playing the first action card held
+        rather than a playable card at random
+      mostColor: True to give a wild card the color held most,
+        False to pick it at random'''
+
+    def __init__(self, actionRate=1.0, mostColor=False):
+        self.actionRate = actionRate
+        self.mostColor = mostColor
+        self.name = 'heuristic:actionRate=%g,mostColor=%d' % (actionRate, mostColor)
+
+    def choose_card(self, observation):
+        matches = observation.matches
+        rng = observation.rng
+        for index in range(len(matches)):
+            #... every card from skip (10) up has an action
+            if matches[index] % uno.NUM_RANKS >= 10:
+                if rng.random() < self.actionRate:
+                    return index + 1
+                break
+        return rng.randrange(1, len(matches) + 1)
+
+    def choose_color(self, observation):
+        if self.mostColor:
+            counts = observation.color_counts()[:4]
+            return counts.index(max(counts)) + 1
+        return observation.rng.randrange(1, 5)
+
+def parse_strategy(spec):
+    '''parse_strategy(spec) -> Strategy
+    returns the strategy of a registered AI level, or a Heuristic from
+      "heuristic:actionRate=0.5,mostColor=1"'''
+    if not spec.startswith('heuristic'):
+        return uno.get_strategy(spec)
+    params = {}
+    if ':' in spec:
+        for item in spec.split(':', 1)[1].split(','):
+            name, value = item.split('=')
+            if name == 'actionRate':
+                params[name] = float(value)
+            elif name == 'mostColor':
+                params[name] = value not in ['0', 'False', 'false']
+            else:
+                raise ValueError('unknown heuristic parameter ' + name)
+    return Heuristic(**params)
+
+def lineups(candidate, baseline, opponents, index):
+    '''lineups(candidate, baseline, opponents, index) -> (list, list, int)
+    returns the Strategies of game index with the candidate and with the
+      baseline, and the seat they play from'''
+    seat = index % (len(opponents) + 1)
+    others = list(opponents)
+    return (others[:seat] + [candidate] + others[seat:],
+            others[:seat] + [baseline] + others[seat:], seat)
+
+def paired_game(aiLevels, seed, index, maxTurns=10000):
+    '''paired_game(aiLevels, seed, index) -> dict
+    plays game index of a comparison: the deck and the first player
+      come from their own random stream, and each seat decides with its
+      own, so the candidate and the baseline draw the same cards for as
+      long as the games go the same way
+      aiLevels are AI levels or Strategies (see uno.UnoComputer)
+    returns the result dict of uno.run_game'''
+    gameSeed = uno.game_seed(seed, index)
+    rng = random.Random(gameSeed)
+    deck = uno.STANDARD_RULES.new_deck(len(aiLevels), rng)
+    pile = uno.UnoPile(deck)
+    players = [uno.UnoComputer('Computer' + str(n + 1), deck, aiLevels[n],
+                               random.Random(gameSeed + ':' + str(n)))
+               for n in range(len(aiLevels))]
+    return uno.run_game(players, deck, pile, None, rng, maxTurns)
+
+def play_pairs(job):
+    '''play_pairs(job) -> list
+    plays games start to stop of a comparison, each with the candidate
+      and with the baseline, job is a tuple (candidate, baseline,
+      opponents, seed, start, stop, maxTurns) of Strategies and AI levels
+    returns a (candidate won, baseline won) pair of ints per game'''
+    candidate, baseline, opponents, seed, start, stop, maxTurns = job
+    #... the strategies are seated as they are, not registered: a worker
+    #... process only knows the built-in levels, and AI_LEVELS stays as it is
+    opponents = [uno.get_strategy(level) for level in opponents]
+    pairs = []
+    for index in range(start, stop):
+        levelsA, levelsB, seat = lineups(candidate, baseline, opponents, index)
+        resultA = paired_game(levelsA, seed, index, maxTurns)
+        resultB = paired_game(levelsB, seed, index, maxTurns)
+        pairs.append((int(resultA['seat'] == seat), int(resultB['seat'] == seat)))
+    return pairs
+
+class PairedTest:
+    '''sequential test of which of two strategies wins more often, on the
+      pairs of games where only one of them won: two of Wald's
+      probability ratio tests, of the candidate winning 1/2 + delta of
+      those pairs and of the baseline doing so, against 1/2
+    attributes:
+      games: the pairs of games counted
+      wins: list of the wins of the candidate and of the baseline
+      better, worse: the pairs won by the candidate only, by the baseline only
+      delta: the edge looked for
+      upper, lower: the bounds of the log likelihood ratios, alpha and
+        beta are the error rates of each test'''
+
+    def __init__(self, alpha=0.05, beta=0.05, delta=0.05):
+        self.games = 0
+        self.wins = [0, 0]
+        self.better = 0
+        self.worse = 0
+        self.delta = delta
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.ahead = math.log((0.5 + delta) / 0.5)
+        self.behind = math.log((0.5 - delta) / 0.5)
+
+    def add(self, winA, winB):
+        '''PairedTest.add(winA, winB) -> None
+        counts a pair of games'''
+        self.games += 1
+        self.wins[0] += winA
+        self.wins[1] += winB
+        if winA > winB:
+            self.better += 1
+        elif winB > winA:
+            self.worse += 1
+
+    def llr(self):
+        '''PairedTest.llr() -> (float, float)
+        returns the log likelihood ratios of the candidate being better
+          and of the baseline being better'''
+        return (self.better * self.ahead + self.worse * self.behind,
+                self.better * self.behind + self.worse * self.ahead)
+
+    def decision(self):
+        '''PairedTest.decision() -> str
+        returns "candidate" or "baseline" once one is better, "even"
+          once neither is better by delta, else None'''
+        candidate, baseline = self.llr()
+        if candidate >= self.upper:
+            return 'candidate'
+        if baseline >= self.upper:
+            return 'baseline'
+        if candidate <= self.lower and baseline <= self.lower:
+            return 'even'
+        return None
+
+    def summary(self):
+        '''PairedTest.summary() -> dict
+        returns the win rates, their difference with its standard error,
+          and how many times more games unpaired runs would need for
+          the same standard error'''
+        n = max(self.games, 1)
+        rateA = self.wins[0] / n
+        rateB = self.wins[1] / n
+        diff = rateA - rateB
+        #... the difference of a pair is 1, -1 or 0
+        paired = (self.better + self.worse) / n - diff * diff
+        unpaired = rateA * (1 - rateA) + rateB * (1 - rateB)
+        return {'games': self.games, 'candidate': rateA, 'baseline': rateB,
+                'difference': diff, 'stderr': math.sqrt(max(paired, 0.0) / n),
+                'pairing_gain': unpaired / paired if paired > 0 else None,
+                'better': self.better, 'worse': self.worse, 'decision': self.decision()}
+
+def compare(candidate, baseline, opponents, seed=0, maxGames=100000, workers=None,
+            chunkSize=500, maxTurns=10000, alpha=0.05, beta=0.05, delta=0.05):
+    '''compare(candidate, baseline, opponents, seed) -> dict
+    plays paired games until the PairedTest decides or maxGames is reached,
+      candidate and baseline are Strategies, opponents the AI levels
+      of the other seats, workers the number of processes (all cores
+      if not given)
+    returns the summary of the test (see PairedTest.summary)'''
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    test = PairedTest(alpha, beta, delta)
+    jobs = ((candidate, baseline, list(opponents), seed, start, min(start + chunkSize, maxGames),
+             maxTurns) for start in range(0, maxGames, chunkSize))
+
+    def run(chunks):
+        for pairs in chunks:
+            for winA, winB in pairs:
+                test.add(winA, winB)
+                if test.decision() is not None:
+                    return
+
+    if workers <= 1:
+        run(play_pairs(job) for job in jobs)
+    else:
+        #... leaving the pool stops the chunks still being played
+        with multiprocessing.Pool(workers) as pool:
+            run(pool.imap(play_pairs, jobs))
+    return test.summary()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Paired comparison of two AI strategies')
+    parser.add_argument('--candidate', required=True,
+                        help='AI level, or heuristic:actionRate=<0-1>,mostColor=<0|1>')
+    parser.add_argument('--baseline', default='Action mode')
+    parser.add_argument('--opponents', default='Random mode,Random mode',
+                        help='AI levels of the other seats, separated by commas')
+    parser.add_argument('--seed', default=0)
+    parser.add_argument('--games', type=int, default=100000, help='most games to play')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--delta', type=float, default=0.05,
+                        help='edge looked for among the pairs only one of them won')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    args = parser.parse_args()
+
+    summary = compare(parse_strategy(args.candidate), parse_strategy(args.baseline),
+                      args.opponents.split(','), args.seed, args.games, args.workers,
+                      alpha=args.alpha, beta=args.alpha, delta=args.delta)
+    print('%d games: candidate %.2f%%, baseline %.2f%%, difference %+.2f%% (+/- %.2f%%)' % (
+        summary['games'], 100 * summary['candidate'], 100 * summary['baseline'],
+        100 * summary['difference'], 100 * summary['stderr']))
+    if summary['pairing_gain'] is not None:
+        print('unpaired games would need %.1f times as many games' % summary['pairing_gain'])
+    print('better: ' + {'candidate': 'candidate', 'baseline': 'baseline',
+                        'even': 'neither, they are even', None: 'no decision'}[summary['decision']])
@@ -6,91 +6,267 @@ Created on Tue Jul 16 20:37:38 2024
 @author: Watson
 """
 
+from array import array
 import random
+
+#... compact card codes: code = color index * NUM_RANKS + rank
+#... 0-9: number cards; 10: skipUno; 11: reverseUno; 12: drawtwoUno; 13: wildUno; 14: drawfourUno
+COLORS = ['red', 'blue', 'green', 'yellow', 'none']
+NUM_RANKS = 15
+NUM_CODES = len(COLORS) * NUM_RANKS
+#... the levels of UnoComputer, one per registered Strategy
+AI_LEVELS = ['First Choice mode', 'Action mode', 'Random mode', 'Monte Carlo mode', 'Endgame mode']
+
+def card_code(rank, color):
+    '''card_code(rank, color) -> int
+    returns the compact code of a card with the given rank and color'''
+    return COLORS.index(color) * NUM_RANKS + rank
+
+def code_rank(code):
+    '''code_rank(code) -> int
+    returns the rank of a card code'''
+    return code % NUM_RANKS
+
+def code_color(code):
+    '''code_color(code) -> str
+    returns the color of a card code'''
+    return COLORS[code // NUM_RANKS]
+
+def code_is_match(code, topcode):
+    '''code_is_match(code, topcode) -> boolean
+    the rule of UnoCard.is_match on card codes'''
+    #... wild cards always match
+    if code // NUM_RANKS == COLORS.index('none'):
+        return True
+    return code // NUM_RANKS == topcode // NUM_RANKS or code % NUM_RANKS == topcode % NUM_RANKS
+
+#... MATCH_ROWS[topcode][code] is 1 if a card with code can be played on topcode
+MATCH_ROWS = [bytes([code_is_match(code, topcode) for code in range(NUM_CODES)])
+              for topcode in range(NUM_CODES)]
+
+def hand_codes(hand):
+    '''hand_codes(hand) -> array
+    returns the codes of a list of UnoCards as a byte array'''
+    return array('B', [card.code for card in hand])
  
+def card_text(rank, color):
+    '''card_text(rank, color) -> str
+    returns the name of a card with the given rank and color'''
+    if rank < 10:
+        return(str(color) + ' ' + str(rank))
+    #... 10: skipUno; 11: reverseUno; 12: drawtwoUno; 13: wildUno; 14: drawfourUno
+    elif rank == 10:
+        return(str(color) + ' Skip')
+    elif rank == 11:
+        return(str(color) + ' Reverse')
+    elif rank == 12:
+        return(str(color) + ' DrawTwo')
+    elif rank == 13:
+        return(str(color) + ' Wild')
+    elif rank == 14:
+        return(str(color) + ' Wild DrawFour')
+
+#... CARD_TEXTS[code] is the name of the card with that code, a wild card
+#... with a color is named with the color chosen
+CARD_TEXTS = [card_text(code % NUM_RANKS, COLORS[code // NUM_RANKS]) for code in range(NUM_CODES)]
+
+#... the one UnoCard of each kind, keyed by (code, action)
+CARD_POOL = {}
+
 class UnoCard:
     '''represents an Uno card
+    there is only one UnoCard of each kind and it can't be changed,
+      the color chosen for a wild card and the action left to apply
+      are kept by the UnoPile
     attributes:
       rank: int from 0 to 9
-      color: string'''
+      color: string
+      action: string
+      code: int, the compact code of the rank and color (see card_code)'''
+
+    __slots__ = ('rank', 'color', 'action', 'code')
  
-    def __init__(self, rank, color, action="none"):
+    def __new__(cls, rank, color, action="none"):
         '''UnoCard(rank, color) -> UnoCard
-        creates an Uno card with the given rank and color'''
-        self.rank = rank
-        self.color = color
-        self.action = action
+        returns the Uno card with the given rank and color'''
         #... 10: skipUno; 11: reverseUno; 12: drawtwoUno; 13: wildUno; 14: drawfourUno
-        if self.rank == 10:
-            self.action = "skip"
-        elif self.rank == 11:
-            self.action = "reverse"
-        elif self.rank == 12:
-            self.action = "drawtwo"
-        elif self.rank == 13:
-            self.action = "wild"
-        elif self.rank == 14:
-             self.action = "drawfour"
+        if rank == 10:
+            action = "skip"
+        elif rank == 11:
+            action = "reverse"
+        elif rank == 12:
+            action = "drawtwo"
+        elif rank == 13:
+            action = "wild"
+        elif rank == 14:
+             action = "drawfour"
+        code = card_code(rank, color)
+        card = CARD_POOL.get((code, action))
+        if card is None:
+            card = object.__new__(cls)
+            object.__setattr__(card, 'rank', rank)
+            object.__setattr__(card, 'color', color)
+            object.__setattr__(card, 'action', action)
+            object.__setattr__(card, 'code', code)
+            CARD_POOL[(code, action)] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UnoCard is immutable")
+
+    def __reduce__(self):
+        #... unpickle to the pooled card
+        return (UnoCard, (self.rank, self.color, self.action))
              
     def __str__(self):
         '''str(Unocard) -> str'''
-        if self.rank < 10:
-            return(str(self.color) + ' ' + str(self.rank))
-        #... 10: skipUno; 11: reverseUno; 12: drawtwoUno; 13: wildUno; 14: drawfourUno
-        elif self.rank == 10:
-            return(str(self.color) + ' Skip')
-        elif self.rank == 11:
-            return(str(self.color) + ' Reverse')
-        elif self.rank == 12:
-            return(str(self.color) + ' DrawTwo')
-        elif self.rank == 13:
-            return(str(self.color) + ' Wild')
-        elif self.rank == 14:
-            return(str(self.color) + ' Wild DrawFour')
+        return CARD_TEXTS[self.code]
         
     def is_match(self, other):
         '''UnoCard.is_match(UnoCard) -> boolean
         returns True if the cards match in rank or color, False if not'''
-        ismatch = False
-        #... match of normal cards
-        if self.color == other.color or self.rank == other.rank:
-            ismatch = True
-        #... wild cards
-        if self.color == "none":
-            ismatch = True
-        return ismatch
+        #... looked up in the table of card codes
+        return MATCH_ROWS[other.code][self.code] == 1
+
+def full_deck():
+    '''full_deck() -> list
+    returns the 108 cards of an Uno deck, in order'''
+    deck = []
+    for color in ['red', 'blue', 'green', 'yellow']:
+        deck.append(UnoCard(0, color))  # one 0 of each color = 4
+        for i in range(2):
+            #... two of each of 1-9 of each color = 18 * 4 = 72
+            #... two of each action card of each color, denoted as
+            #... 10: skipUno; 11: reverseUno; 12: drawtwoUno = 3 * 2 * 4 = 24
+            for n in range(1, 13):
+                deck.append(UnoCard(n, color))
+    #... add four wild card
+    color = 'none'
+    for n in range(4):
+        #... 20: wild card
+        nrank = 13
+        deck.append(UnoCard(nrank, color))
+    #... add four wild drawfour
+    for n in range(4):
+        #... 20: wild card
+        nrank = 14
+        deck.append(UnoCard(nrank, color))
+    #... check total number of cards
+    #print("total cards = ", len(deck))
+    return deck
+
+FULL_DECK = full_deck()
+
+#... the card of each code in a deck, None for codes no card has
+CODE_CARDS = [None] * NUM_CODES
+for card in FULL_DECK:
+    CODE_CARDS[card.code] = card
+
+class UnoHand(list):
+    '''represents the cards in a player's hand, a list of UnoCards that
+      keeps count of its colors and ranks as cards come and go, so the
+      counts are known without going through the hand
+    the counts are only taken once asked for (see counts): a hand put
+      back by GameState.restore costs no more than a list until then
+    change it with append, remove and hand[:] = cards only
+    attributes:
+      colorCounts: list of the number of cards of each color of COLORS,
+        the last one counts the wild cards, None until counted
+      rankCounts: list of the number of cards of each rank, None until
+        counted
+      rendered: the text of the hand (see text), None until asked for
+        again after a change'''
+
+    def __init__(self, cards=()):
+        '''UnoHand(cards) -> UnoHand
+        creates a hand holding cards'''
+        list.__init__(self, cards)
+        self.colorCounts = None
+        self.rankCounts = None
+        self.rendered = None
+
+    def counts(self):
+        '''UnoHand.counts() -> (list, list)
+        returns the color counts and the rank counts, counting the
+          cards if they have not been since the hand was replaced'''
+        if self.colorCounts is None:
+            colorCounts = [0] * len(COLORS)
+            rankCounts = [0] * NUM_RANKS
+            for card in self:
+                colorCounts[card.code // NUM_RANKS] += 1
+                rankCounts[card.rank] += 1
+            self.colorCounts = colorCounts
+            self.rankCounts = rankCounts
+        return self.colorCounts, self.rankCounts
+
+    def __setitem__(self, index, cards):
+        list.__setitem__(self, index, cards)
+        self.colorCounts = None
+        self.rankCounts = None
+        self.rendered = None
+
+    def append(self, card):
+        '''UnoHand.append(card) -> None
+        adds a card to the hand'''
+        list.append(self, card)
+        if self.colorCounts is not None:
+            self.colorCounts[card.code // NUM_RANKS] += 1
+            self.rankCounts[card.rank] += 1
+        self.rendered = None
+
+    def remove(self, card):
+        '''UnoHand.remove(card) -> None
+        removes the first card of this kind from the hand'''
+        list.remove(self, card)
+        if self.colorCounts is not None:
+            self.colorCounts[card.code // NUM_RANKS] -= 1
+            self.rankCounts[card.rank] -= 1
+        self.rendered = None
+
+    def text(self):
+        '''UnoHand.text() -> str
+        returns the names of the cards, one per line, kept until the
+          hand changes'''
+        if self.rendered is None:
+            self.rendered = ''.join([CARD_TEXTS[card.code] + '\n' for card in self])
+        return self.rendered
+
+    def color_count(self, color):
+        '''UnoHand.color_count(color) -> int
+        returns the number of cards of a color, "none" for the wild cards'''
+        return self.counts()[0][COLORS.index(color)]
+
+    def rank_count(self, rank):
+        '''UnoHand.rank_count(rank) -> int
+        returns the number of cards of a rank'''
+        return self.counts()[1][rank]
+
+    def wild_count(self):
+        '''UnoHand.wild_count() -> int
+        returns the number of wild cards'''
+        return self.counts()[0][-1]
  
 class UnoDeck:
     '''represents a deck of Uno cards
-    attribute:
-      deck: list of UnoCards'''
+    a lazy deck is not shuffled up front: each card is dealt from a
+      random place among those left, one step of a Fisher-Yates shuffle,
+      so a game only pays for shuffling the cards it deals, and the
+      order of the cards dealt is as random as from a shuffled deck
+    attributes:
+      deck: list of UnoCards, in no particular order for a lazy deck
+      lazy: boolean, True if the cards are shuffled as they are dealt'''
  
-    def __init__(self):
+    def __init__(self, rng=random, cards=None, lazy=False):
         '''UnoDeck() -> UnoDeck
-        creates a new full Uno deck'''
-        self.deck = []
-        for color in ['red', 'blue', 'green', 'yellow']:
-            self.deck.append(UnoCard(0, color))  # one 0 of each color = 4
-            for i in range(2):
-                #... two of each of 1-9 of each color = 18 * 4 = 72
-                #... two of each action card of each color, denoted as
-                #... 10: skipUno; 11: reverseUno; 12: drawtwoUno = 3 * 2 * 4 = 24
-                for n in range(1, 13):
-                    self.deck.append(UnoCard(n, color))
-        #... add four wild card
-        color = 'none'
-        for n in range(4):
-            #... 20: wild card
-            nrank = 13
-            self.deck.append(UnoCard(nrank, color))
-        #... add four wild drawfour
-        for n in range(4):
-            #... 20: wild card
-            nrank = 14
-            self.deck.append(UnoCard(nrank, color))
-        #... check total number of cards
-        #print("total cards = ", len(self.deck))
-        random.shuffle(self.deck)  # shuffle the deck
+        creates a new full Uno deck
+          rng is the random source used to shuffle the deck
+          cards is the list of cards to use instead of FULL_DECK
+          lazy shuffles the cards as they are dealt instead of up front'''
+        self.rng = rng
+        self.lazy = lazy
+        self.deck = list(FULL_DECK if cards is None else cards)
+        if not lazy:
+            self.rng.shuffle(self.deck)  # shuffle the deck
  
     def __str__(self):
         '''str(Unodeck) -> str'''
@@ -107,71 +283,145 @@ class UnoDeck:
         '''UnoDeck.deal_card() -> UnoCard
         deals a card from the deck and returns it
         (the dealt card is removed from the deck)'''
-        return self.deck.pop()
+        deck = self.deck
+        if self.lazy:
+            #... the card at a random place is dealt and the last card takes its place
+            index = self.rng.randrange(len(deck))
+            card = deck[index]
+            deck[index] = deck[-1]
+            deck.pop()
+            return card
+        return deck.pop()
+ 
+    def put_back(self, card):
+        '''UnoDeck.put_back(card) -> None
+        puts a card dealt back at the bottom of the deck'''
+        self.deck.insert(0, card)
+
+    def add_decks(self, count, cards=FULL_DECK):
+        '''UnoDeck.add_decks(count) -> None
+        shuffles count more decks of cards in with the cards left'''
+        self.deck += list(cards) * count
+        if not self.lazy:
+            self.rng.shuffle(self.deck)
  
     def reset_deck(self, pile):
         '''UnoDeck.reset_deck(pile) -> None
         resets the deck from the pile'''
         if len(self.deck) != 0:
             return
-        self.deck = pile.reset_pile() # get cards from the pile
-        random.shuffle(self.deck)  # shuffle the deck
+        #... the pile takes over the empty list of the deck
+        self.deck = pile.reset_pile(self.deck) # get cards from the pile
+        if not self.lazy:
+            self.rng.shuffle(self.deck)  # shuffle the deck
+
+class UnoShoe(UnoDeck):
+    '''represents a shoe of several Uno decks dealt together, for large
+      tables, it is a lazy UnoDeck so the decks are never shuffled up front
+    attributes:
+      deck: list of the UnoCards left, in no particular order
+      decks: int, the number of decks in the shoe'''
+
+    def __init__(self, rng=random, decks=1, cards=FULL_DECK):
+        '''UnoShoe(rng, decks) -> UnoShoe
+        creates a shoe of decks full Uno decks
+          rng is the random source the cards are dealt with
+          cards is the list of the cards of one deck'''
+        UnoDeck.__init__(self, rng, list(cards) * decks, lazy=True)
+        self.decks = decks
+
+    def __str__(self):
+        '''str(UnoShoe) -> str'''
+        return 'An Uno shoe of ' + str(self.decks) + ' decks with ' + str(len(self.deck)) + ' cards remaining.'
+
+    def add_decks(self, count, cards=FULL_DECK):
+        '''UnoShoe.add_decks(count) -> None
+        adds count more decks of cards to the shoe'''
+        UnoDeck.add_decks(self, count, cards)
+        self.decks += count
  
 class UnoPile:
     '''represents the discard pile in Uno
-    attribute:
-      pile: list of UnoCards'''
+    attributes:
+      pile: list of UnoCards
+      color: string, the color to match, chosen by the player for a wild card
+      action: string, the action of the top card, "none" once applied
+      penalty: int, the cards owed for the DrawTwos and DrawFours stacked
+        under the top card (see Rules)'''
  
     def __init__(self, deck):
         '''UnoPile(deck) -> UnoPile
         creates a new pile by drawing a card from the deck'''
+        if not any(card.color != "none" for card in deck.deck):
+            raise ValueError('the deck has no card to start the pile with')
         card = deck.deal_card()
+        #... initialize the pile list by dealing one card from the deck
+        #... if the initial top is a wild card, put it back and deal another one
         while card.color == "none":
+            deck.put_back(card)
             card = deck.deal_card()
-        #... initialize the pile list by dealing one card from the deck
-        #... if the initial top is a wild card, deal another one from the deck
         self.pile = [card]
+        self.color = card.color
+        self.action = card.action
+        self.penalty = 0
  
     def __str__(self):
         '''str(UnoPile) -> str'''
-        return 'The pile has ' + str(self.pile[-1]) + ' on top.'
+        return 'The pile has ' + CARD_TEXTS[self.top_code()] + ' on top.'
  
     def top_card(self):
         '''UnoPile.top_card() -> UnoCard
         returns the top card in the pile'''
         return self.pile[-1]
+
+    def top_code(self):
+        '''UnoPile.top_code() -> int
+        returns the code of the top card with the color to match'''
+        return card_code(self.pile[-1].rank, self.color)
  
-    def add_card(self, card):
-        '''UnoPile.add_card(card) -> None
-        adds the card to the top of the pile'''
+    def add_card(self, card, color=None):
+        '''UnoPile.add_card(card, color) -> None
+        adds the card to the top of the pile,
+          color is the color chosen for a wild card'''
         self.pile.append(card)
+        if color is None:
+            color = card.color
+        self.color = color
+        self.action = card.action
         
     def check_action(self):
-        return self.top_card().action
+        return self.action
     
     def remove_action(self):
-        self.top_card().action = "none"
-        return self.top_card().action
+        self.action = "none"
+        return self.action
  
-    def reset_pile(self):
-        '''UnoPile.reset_pile() -> list
+    def reset_pile(self, spare=None):
+        '''UnoPile.reset_pile(spare) -> list
         removes all but the top card from the pile and
-          returns the rest of the cards as a list of UnoCards'''
-        newdeck = self.pile[:-1]
-        self.pile = [self.pile[-1]]
+          returns the rest of the cards as a list of UnoCards
+          spare is an empty list to reuse for the new pile'''
+        if spare is None:
+            spare = []
+        top = self.pile.pop()
+        newdeck = self.pile
+        spare.append(top)
+        self.pile = spare
         return newdeck
  
 class UnoPlayer:
     '''represents a player of Uno
     attributes:
       name: a string with the player's name
-      hand: a list of UnoCards'''
+      hand: an UnoHand of UnoCards
+      drawn: an int counting the cards drawn during the game'''
  
     def __init__(self, name, deck):
         '''UnoPlayer(name, deck) -> UnoPlayer
         creates a new player with a new 7-card hand'''
         self.name = name
-        self.hand = [deck.deal_card() for i in range(7)]
+        self.hand = UnoHand([deck.deal_card() for i in range(7)])
+        self.drawn = 0
  
     def __str__(self):
         '''str(UnoPlayer) -> UnoPlayer'''
@@ -185,10 +435,7 @@ class UnoPlayer:
     def get_hand(self):
         '''get_hand(self) -> str
         returns a string representation of the hand, one card per line'''
-        output = ''
-        for card in self.hand:
-            output += str(card) + '\n'
-        return output
+        return self.hand.text()
  
     def has_won(self):
         '''UnoPlayer.has_won() -> boolean
@@ -201,175 +448,683 @@ class UnoPlayer:
           and returns the card drawn'''
         card = deck.deal_card()  # get card from the deck
         self.hand.append(card)   # add this card to the hand
+        self.drawn += 1
         return card
+
+    def join(self, order, deck, pile, rules=None):
+        '''UnoPlayer.join(order, deck, pile, rules) -> None
+        seats the player at the table when the game starts,
+          order is the TurnOrder of the game and rules its Rules,
+          the standard ones if not given'''
+        self.order = order
+        self.deck = deck
+        self.pile = pile
+        self.rules = STANDARD_RULES if rules is None else rules
+
+    def default_sink(self):
+        '''UnoPlayer.default_sink() -> callable
+        returns the sink used when none is given: a person sees
+          the game on the console'''
+        return console_sink
+
+    def acknowledge(self, prompt="Press enter to continue."):
+        '''UnoPlayer.acknowledge(prompt) -> None
+        waits for the player to read a message about their turn'''
+        input(prompt)
+
+    def choose_card(self, matches):
+        '''UnoPlayer.choose_card(matches) -> int
+        returns the player's choice (counted from 1) among the playable cards'''
+        choice = 0
+        while choice < 1 or choice > len(matches):
+            choicestr = input("Which do you want to play? ")
+            if choicestr.isdigit():
+                choice = int(choicestr)
+        return choice
+
+    def choose_stack(self, stack):
+        '''UnoPlayer.choose_stack(stack) -> int
+        returns the player's choice (counted from 1) among the cards
+          they can pass a penalty on with, len(stack) + 1 to draw the
+          cards instead (see Rules.stacking)'''
+        return self.choose_card(stack + [DRAW_INSTEAD])
+
+    def choose_color(self, icolor):
+        '''UnoPlayer.choose_color(icolor) -> int
+        returns the player's choice (counted from 1) of the wild card color'''
+        choice = 0
+        while choice < 1 or choice > len(icolor):
+            choicestr = input("What color do you want for the wild card? ")
+            if choicestr.isdigit():
+                choice = int(choicestr)
+        return choice
+
+    def choose_player(self, others):
+        '''UnoPlayer.choose_player(others) -> int
+        returns the player's choice (counted from 1) of the player
+          to swap hands with'''
+        choice = 0
+        while choice < 1 or choice > len(others):
+            choicestr = input("Whose hand do you want? ")
+            if choicestr.isdigit():
+                choice = int(choicestr)
+        return choice
  
-    def play_card(self, card, pile):
+    def play_card(self, card, pile, sink=None):
         '''UnoPlayer.play_card(card, pile) -> None
         plays a card from the player's hand to the pile
         CAUTION: does not check if the play is legal!'''
+        if sink is None:
+            sink = self.default_sink()
         self.hand.remove(card)
-        pile.add_card(card)
+        color = None
         if card.color == "none":
             #... pick a color for the wild card
             icolor = ['red', 'blue', 'green', 'yellow']
-            for index in range(4):
-                # print the color to be assigned to the wild card
-                print(str(index + 1) + ": " + str(icolor[index]))
+            # print the color to be assigned to the wild card
+            if sink is not None:
+                sink("colors", self, icolor)
             # get player's choice of which color to assign
-            choice = 0
-            while choice < 1 or choice > len(icolor):
-                choicestr = input("What color do you want for the wild card? ")
-                if choicestr.isdigit():
-                    choice = int(choicestr)
-            # assign the chosen color to the wild card
-            card.color = icolor[choice - 1]
-        print(pile)
+            choice = self.choose_color(icolor)
+            # the pile keeps the chosen color of the wild card
+            color = icolor[choice - 1]
+        pile.add_card(card, color)
+        if sink is not None:
+            sink("play", self, card, pile)
 
-    def take_turn(self, deck, pile):
+    def take_turn(self, deck, pile, sink=None):
         '''UnoPlayer.take_turn(deck, pile) -> None
         takes the player's turn in the game
           deck is an UnoDeck representing the current deck
-          pile is an UnoPile representing the discard pile'''
+          pile is an UnoPile representing the discard pile
+          sink is the callable receiving the game events,
+            default_sink() if not given'''
+        if sink is None:
+            sink = self.default_sink()
         
         # print player info
-        print(self.name + ", it's your turn.")
-        print(pile)
-        print("Your hand: ")
-        print(self.get_hand())
+        if sink is not None:
+            sink("turn", self, pile)
         # get a list of cards that can be played
-        topcard = pile.top_card()
-        matches = [card for card in self.hand if card.is_match(topcard)]
+        topcode = pile.top_code()
+        row = MATCH_ROWS[topcode]
+        matches = [card for card in self.hand if row[card.code]]
         
         #... can play
         if len(matches) > 0:
-            for index in range(len(matches)):
-                # print the playable cards with their number
-                print(str(index + 1) + ": " + str(matches[index]))
+            # print the playable cards with their number
+            if sink is not None:
+                sink("choices", self, matches)
             # get player's choice of which card to play
-            choice = 0
-            while choice < 1 or choice > len(matches):
-                choicestr = input("Which do you want to play? ")
-                if choicestr.isdigit():
-                    choice = int(choicestr)
+            choice = self.choose_card(matches)
             # play the chosen card from hand, add it to the pile
-            self.play_card(matches[choice - 1], pile)
+            self.play_card(matches[choice - 1], pile, sink)
             
         #... can't play
         else:
-            print("You can't play, so you have to draw.")
-            input("Press enter to draw.")
+            if sink is not None:
+                sink("cantplay", self)
+            self.acknowledge("Press enter to draw.")
             
             # check if deck is empty -- if so, reset it
             if deck.is_empty():
                 deck.reset_deck(pile)
             
-            # draw a new card from the deck
-            newcard = self.draw_card(deck)
-            print("You drew: "+str(newcard))
-            if newcard.is_match(topcard): # can be played
-                print("Good -- you can play that!")
-                self.play_card(newcard,pile)
+            #... every card is in someone's hand, nothing to draw
+            if deck.is_empty():
+                if sink is not None:
+                    sink("nodraw", self)
             
-            #... still can't play   
             else:
-                print("Sorry, you still can't play.")
+                # draw a new card from the deck
+                newcard = self.draw_card(deck)
+                playable = row[newcard.code] == 1
+                if sink is not None:
+                    sink("draw", self, newcard, playable)
+                if playable: # can be played
+                    self.play_card(newcard,pile, sink)
             
-            input("Press enter to continue.")
+            self.acknowledge()
+
+class Observation:
+    '''what a computer player sees when it makes a decision, in card codes
+    attributes:
+      hand: sequence of the codes of the player's hand
+      matches: list of the codes of the playable cards, in the order of
+        the hand, empty when a wild card color is chosen
+      top: the code to match on the pile, with the color of a wild card
+      seat: the player's seat
+      rng: the random source of the player
+      player: the UnoComputer deciding, None in the batch engine
+      hands: the hands of every seat, read by hand_sizes only'''
+
+    __slots__ = ('hand', 'matches', 'top', 'seat', 'rng', 'player', 'hands', 'counts')
+
+    def __init__(self, hand, matches, top, seat, rng, hands=None):
+        self.hand = hand
+        self.matches = matches
+        self.top = top
+        self.seat = seat
+        self.rng = rng
+        self.player = None
+        self.hands = hands
+        self.counts = None
+
+    def color_counts(self):
+        '''Observation.color_counts() -> list
+        returns the number of cards of each color in the hand,
+          wild cards last (see COLORS)'''
+        if self.counts is None:
+            counts = [0] * len(COLORS)
+            for code in self.hand:
+                counts[code // NUM_RANKS] += 1
+            self.counts = counts
+        return self.counts
+
+    def hand_sizes(self):
+        '''Observation.hand_sizes() -> list
+        returns the number of cards of each seat'''
+        return [len(hand) for hand in self.hands]
+
+class PlayerObservation(Observation):
+    '''the Observation of an UnoComputer: the hand and the table are
+      only read from the player's game when a strategy asks for them'''
+
+    __slots__ = ()
+
+    def __init__(self, player, matches):
+        self.player = player
+        self.matches = matches
+        self.rng = player.rng
+
+    @property
+    def hand(self):
+        return hand_codes(self.player.hand)
+
+    @property
+    def top(self):
+        return self.player.pile.top_code()
+
+    @property
+    def seat(self):
+        return self.player.order.players.index(self.player)
+
+    def color_counts(self):
+        #... kept by the UnoHand as it changes
+        return self.player.hand.counts()[0]
+
+    def hand_sizes(self):
+        return [len(player.hand) for player in self.player.order.players]
+
+class Strategy:
+    '''the decisions of a computer player, made from Observations
+    a strategy overrides choose_card and choose_color; one that decides
+      faster many at a time also overrides choose_cards and choose_colors,
+      and one that decides on NumPy arrays choose_batch_cards and
+      choose_batch_colors, which the batch engine calls with the
+      batch.BatchObservation of a step and the mask of its rows waiting
+      on the strategy (the built-in ones are vectorized in batch)
+    attributes:
+      name: the AI level the strategy is registered as
+      compact: True if it decides from the observation alone, without
+        the UnoComputer (the batch engine only plays those)'''
+
+    name = None
+    compact = True
+
+    def choose_card(self, observation):
+        '''Strategy.choose_card(observation) -> int
+        returns the choice (counted from 1) among observation.matches'''
+        raise NotImplementedError
+
+    def choose_color(self, observation):
+        '''Strategy.choose_color(observation) -> int
+        returns the choice (counted from 1) of the wild card color,
+          among the first four COLORS'''
+        raise NotImplementedError
+
+    def choose_cards(self, observations):
+        '''Strategy.choose_cards(observations) -> list
+        returns the choice of card for each observation'''
+        return [self.choose_card(observation) for observation in observations]
+
+    def choose_colors(self, observations):
+        '''Strategy.choose_colors(observations) -> list
+        returns the choice of wild card color for each observation'''
+        return [self.choose_color(observation) for observation in observations]
+
+    def choose_batch_cards(self, games, observations, rows):
+        '''Strategy.choose_batch_cards(games, observations, rows) -> sequence
+        returns the choice of card for each row of a BatchObservation of
+          the batch.BatchGames games in the mask rows, the rows of the
+          strategy's players who can play'''
+        return self.choose_cards(games.observations(observations.subset(rows), False))
+
+    def choose_batch_colors(self, games, observations, rows):
+        '''Strategy.choose_batch_colors(games, observations, rows) -> sequence
+        returns the choice of wild card color for each row of a
+          BatchObservation of the batch.BatchGames games in the mask rows'''
+        return self.choose_colors(games.observations(observations.subset(rows), True))
+
+class FirstChoice(Strategy):
+    '''plays the first playable card of the hand, and makes wild cards red'''
+
+    name = "First Choice mode"
+
+    def choose_card(self, observation):
+        return 1
+
+    def choose_color(self, observation):
+        return 1
+
+    def choose_cards(self, observations):
+        return [1] * len(observations)
+
+    def choose_colors(self, observations):
+        return [1] * len(observations)
+
+    def choose_batch_cards(self, games, observations, rows):
+        #... imported here, batch imports this module
+        import batch
+        #... deciding for every row is cheaper than taking the rows out
+        return batch.first_choices(observations)[rows]
+
+    def choose_batch_colors(self, games, observations, rows):
+        import batch
+        return batch.first_choices(observations)[rows]
+
+class ActionFirst(Strategy):
+    '''looks for an action card to play, picks the wild card color at random'''
+
+    name = "Action mode"
+
+    def choose_card(self, observation):
+        #... find the action card, if more than 1 action card, choose the first
+        matches = observation.matches
+        for code in matches:
+            #... every card from skip (10) up has an action
+            if code % NUM_RANKS >= 10:
+                choice = matches.index(code)
+            else:
+                choice = observation.rng.randrange(1, len(matches) + 1)
+        return choice
+
+    def choose_color(self, observation):
+        return observation.rng.randrange(1, 5)
+
+    def choose_batch_cards(self, games, observations, rows):
+        #... imported here, batch imports this module
+        import batch
+        #... deciding for every row is cheaper than taking the rows out
+        return batch.action_cards(observations)[rows]
+
+    def choose_batch_colors(self, games, observations, rows):
+        import batch
+        return batch.random_colors(observations)[rows]
+
+class RandomChoice(Strategy):
+    '''plays a playable card and picks the wild card color at random'''
+
+    name = "Random mode"
+
+    def choose_card(self, observation):
+        return observation.rng.randrange(1, len(observation.matches) + 1)
+
+    def choose_color(self, observation):
+        return observation.rng.randrange(1, 5)
+
+    def choose_batch_cards(self, games, observations, rows):
+        #... imported here, batch imports this module
+        import batch
+        #... deciding for every row is cheaper than taking the rows out
+        return batch.random_cards(observations)[rows]
+
+    def choose_batch_colors(self, games, observations, rows):
+        import batch
+        return batch.random_colors(observations)[rows]
+
+class MonteCarloSearch(Strategy):
+    '''plays the move that wins most play-outs (see montecarlo.search)'''
+
+    name = "Monte Carlo mode"
+    compact = False
+
+    def choose_card(self, observation):
+        #... imported here, montecarlo imports this module
+        import montecarlo
+        player = observation.player
+        matches = [CODE_CARDS[code] for code in observation.matches]
+        card, player.wildColor = montecarlo.search(player, matches)
+        return matches.index(card) + 1
+
+    def choose_color(self, observation):
+        player = observation.player
+        if player.wildColor is not None:
+            choice = COLORS.index(player.wildColor) + 1
+            player.wildColor = None
+        else:
+            #... a drawn wild card is played at once, without a search:
+            #... take the color the computer holds most of
+            counts = observation.color_counts()[:4]
+            choice = counts.index(max(counts)) + 1
+        return choice
+
+class EndgameSearch(Strategy):
+    '''plays as "Action mode" until every hand holds threshold cards or
+      fewer, then plays a move that wins by force if the solver finds
+      one (see endgame.search, standard rules only): it sees every hand
+      and the deck. Once it has found one it keeps to the solver's
+      moves, even when a hand grows past threshold again, so the win
+      stays forced
+    attributes:
+      threshold: the most cards in any hand for the solver to be used
+      fallback: the Strategy played otherwise'''
+
+    name = "Endgame mode"
+    compact = False
+
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        self.fallback = ActionFirst()
+
+    def choose_card(self, observation):
+        player = observation.player
+        if player.forcedWin or max(observation.hand_sizes()) <= self.threshold:
+            #... imported here, endgame imports this module
+            import endgame
+            matches = [CODE_CARDS[code] for code in observation.matches]
+            move = endgame.search(player, matches)
+            player.forcedWin = move is not None
+            if move is not None:
+                card, player.wildColor = move
+                return matches.index(card) + 1
+        return self.fallback.choose_card(observation)
+
+    def choose_color(self, observation):
+        player = observation.player
+        if player.wildColor is not None:
+            choice = COLORS.index(player.wildColor) + 1
+            player.wildColor = None
+            return choice
+        if player.forcedWin:
+            #... a wild card drawn and played at once, no card was chosen
+            import endgame
+            color = endgame.winning_color(player)
+            if color is not None:
+                return COLORS.index(color) + 1
+        return self.fallback.choose_color(observation)
+
+#... the strategies of the computer players by AI level
+STRATEGIES = {}
+
+def register_strategy(strategy):
+    '''register_strategy(strategy) -> None
+    makes a Strategy the AI level of its name, a new level is added
+      at the end of AI_LEVELS'''
+    if strategy.name not in AI_LEVELS:
+        AI_LEVELS.append(strategy.name)
+    STRATEGIES[strategy.name] = strategy
+
+def get_strategy(aiLevel):
+    '''get_strategy(aiLevel) -> Strategy
+    returns the strategy of an AI level, raises ValueError if there is none'''
+    strategy = STRATEGIES.get(aiLevel)
+    if strategy is None:
+        raise ValueError('unknown AI level ' + str(aiLevel))
+    return strategy
+
+register_strategy(FirstChoice())
+register_strategy(ActionFirst())
+register_strategy(RandomChoice())
+register_strategy(MonteCarloSearch())
+register_strategy(EndgameSearch())
 
 class UnoComputer(UnoPlayer):
     '''represents a computer player of Uno
     attributes:
       name: a string with the player's name
-      hand: a list of UnoCards
-      aiLevel: an int of how smart it is. It has three levels'''
+      hand: an UnoHand of UnoCards
+      aiLevel: the name of how smart it is (see AI_LEVELS)
+      strategy: the Strategy registered for aiLevel, which makes its
+        choices, or the Strategy given as aiLevel, which need not be
+        registered
+      rng: the random source behind the computer's choices
+      rollouts: the number of games "Monte Carlo mode" plays out per move
+      timeLimit: if not None, "Monte Carlo mode" plays out games for this
+        many milliseconds per move instead'''
     
-    def __init__(self, name, deck, aiLevel):
+    def __init__(self, name, deck, aiLevel, rng=random, rollouts=200, timeLimit=None):
         UnoPlayer.__init__(self, name, deck)
-        self.aiLevel = aiLevel
-    
-    def take_turn(self, deck, pile):
-        '''UnoComputer.take_turn(deck, pile) -> None
-        takes the Computer's turn in the game
-          deck is an UnoDeck representing the current deck
-          pile is an UnoPile representing the discard pile'''
-        
-        # print player info
-        print(self.name + ", it's your turn.")
+        if isinstance(aiLevel, Strategy):
+            self.aiLevel = aiLevel.name
+            self.strategy = aiLevel
+        else:
+            self.aiLevel = aiLevel
+            self.strategy = get_strategy(aiLevel)
+        self.rng = rng
+        self.rollouts = rollouts
+        self.timeLimit = timeLimit
+        #... the wild card color picked with the card by "Monte Carlo mode"
+        self.wildColor = None
+        #... True while "Endgame mode" is playing a win by force
+        self.forcedWin = False
+
+    def default_sink(self):
+        '''UnoComputer.default_sink() -> None
+        the computer plays silently when no sink is given'''
+        return None
+
+    def acknowledge(self, prompt="Press enter to continue."):
+        '''UnoComputer.acknowledge(prompt) -> None
+        the computer does not wait for anyone'''
+        pass
+
+    def observe(self, matches):
+        '''UnoComputer.observe(matches) -> Observation
+        returns what the computer sees, matches is a list of UnoCards'''
+        return PlayerObservation(self, [card.code for card in matches])
+
+    def choose_card(self, matches):
+        '''UnoComputer.choose_card(matches) -> int
+        returns the computer's choice (counted from 1) among the playable cards'''
+        return self.strategy.choose_card(PlayerObservation(self, [card.code for card in matches]))
+
+    def choose_color(self, icolor):
+        '''UnoComputer.choose_color(icolor) -> int
+        returns the computer's choice (counted from 1) of the wild card color'''
+        return self.strategy.choose_color(self.observe([]))
+
+    def choose_stack(self, stack):
+        '''UnoComputer.choose_stack(stack) -> int
+        returns the computer's choice (counted from 1) among the cards
+          it can pass a penalty on with: it always passes it on'''
+        return self.choose_card(stack)
+
+    def choose_player(self, others):
+        '''UnoComputer.choose_player(others) -> int
+        returns the computer's choice (counted from 1) of the player
+          to swap hands with: the one holding the fewest cards'''
+        counts = [len(other.hand) for other in others]
+        return counts.index(min(counts)) + 1
+
+class TurnOrder:
+    '''represents the order of play around the table
+    attributes:
+      players: list of the players, in their seats
+      current: int, the seat of the player whose turn it is
+      direction: 1, or -1 once the order has been reversed'''
+
+    def __init__(self, players, current=0):
+        '''TurnOrder(players, current) -> TurnOrder
+        starts the order of play at seat current'''
+        self.players = list(players)
+        self.current = current
+        self.direction = 1
+
+    def current_player(self):
+        '''TurnOrder.current_player() -> UnoPlayer
+        returns the player whose turn it is'''
+        return self.players[self.current]
+
+    def peek(self, steps=1):
+        '''TurnOrder.peek(steps) -> UnoPlayer
+        returns the player steps turns away, without moving,
+          peek(-1) is the player who played last'''
+        return self.players[(self.current + steps * self.direction) % len(self.players)]
+
+    def advance(self, steps=1):
+        '''TurnOrder.advance(steps) -> UnoPlayer
+        moves the turn on by steps players and returns the new current player'''
+        self.current = (self.current + steps * self.direction) % len(self.players)
+        return self.players[self.current]
+
+    def skip(self):
+        '''TurnOrder.skip() -> UnoPlayer
+        passes over the next player and returns the one after'''
+        return self.advance(2)
+
+    def reverse(self):
+        '''TurnOrder.reverse() -> None
+        reverses the direction of play'''
+        self.direction = -self.direction
+
+    def in_order(self):
+        '''TurnOrder.in_order() -> list
+        returns the players listed in the direction of play'''
+        if self.direction == 1:
+            return self.players
+        return self.players[::-1]
+
+class GameState:
+    '''represents everything that changes during a game of Uno
+    attributes:
+      deck: the UnoDeck
+      pile: the UnoPile
+      order: the TurnOrder of the players
+      turns: int, the number of turns played so far
+      rules: the Rules of the game
+      actions: dict of the function playing a turn for each action
+        of the top card, compiled from the rules (see Rules.compile)'''
+
+    def __init__(self, players, deck, pile, current=0, rules=None):
+        '''GameState(players, deck, pile, current) -> GameState
+        starts a game with the player at seat current to play,
+          under the standard rules if none are given'''
+        self.deck = deck
+        self.pile = pile
+        self.order = TurnOrder(players, current)
+        self.turns = 0
+        self.rules = STANDARD_RULES if rules is None else rules
+        self.actions = self.rules.compile()
+
+    def snapshot(self):
+        '''GameState.snapshot() -> tuple
+        returns a copy of the state as one string of card codes per
+          place (deck, pile and each hand) plus a few numbers,
+          the random sources are not part of it'''
+        return (bytes([card.code for card in self.deck.deck]),
+                bytes([card.code for card in self.pile.pile]),
+                tuple([bytes([card.code for card in player.hand])
+                       for player in self.order.players]),
+                tuple([player.drawn for player in self.order.players]),
+                self.pile.color, self.pile.action, self.pile.penalty,
+                self.order.current, self.order.direction, self.turns)
+
+    def restore(self, snapshot):
+        '''GameState.restore(snapshot) -> None
+        puts the game back in the state of a snapshot'''
+        deckCodes, pileCodes, handCodes, drawn, color, action, penalty, \
+            current, direction, turns = snapshot
+        #... the cards are immutable, so the pooled ones are put back
+        self.deck.deck[:] = [CODE_CARDS[code] for code in deckCodes]
+        self.pile.pile[:] = [CODE_CARDS[code] for code in pileCodes]
+        players = self.order.players
+        for seat in range(len(players)):
+            players[seat].hand[:] = [CODE_CARDS[code] for code in handCodes[seat]]
+            players[seat].drawn = drawn[seat]
+        self.pile.color = color
+        self.pile.action = action
+        self.pile.penalty = penalty
+        self.order.current = current
+        self.order.direction = direction
+        self.turns = turns
+
+#... text output of the game events
+def console_sink(event, *args):
+    '''console_sink(event, *args) -> None
+    prints a game event to the console, the events are
+      "start", order, pile      the cards are dealt (not printed)
+      "status", playerList      the players before each turn
+      "turn", player, pile      a player starts a turn
+      "choices", player, cards  the cards the player can play
+      "colors", player, colors  the colors for a wild card
+      "play", player, card, pile
+      "cantplay", player        no card in hand can be played
+      "draw", player, card, playable
+      "nodraw", player          the deck and the pile are both empty
+      "penalty", player, card   a card drawn for a DrawTwo or a DrawFour
+                                (not printed)
+      "skip", player
+      "reverse", player         the player who played the reverse card
+      "drawtwo", player
+      "drawfour", player
+      "stack", player           the player passes the penalty on with
+                                a DrawTwo or a DrawFour
+      "jumpin", player          the player plays the card on top out of turn
+      "players", player, others the players to swap hands with
+      "swap", player, other     the player swaps hands with other
+      "rotate", player          every hand moves on in the direction of play
+      "win", player'''
+    if event == "status":
+        print('-------')
+        for player in args[0]:
+            print(player)
+        print('-------')
+    elif event == "turn":
+        player, pile = args
+        print(player.name + ", it's your turn.")
         print(pile)
         print("Your hand: ")
-        print(self.get_hand())
-        # get a list of cards that can be played
-        topcard = pile.top_card()
-        matches = [card for card in self.hand if card.is_match(topcard)]
-        
-        #... can play
-        if len(matches) > 0:
-            for index in range(len(matches)):
-                # print the playable cards with their number
-                print(str(index + 1) + ": " + str(matches[index]))
-                
-            # computer's choice of which card to play
-            if self.aiLevel == "First Choice mode":
-                choice = 1
-            elif self.aiLevel == "Action mode":
-                #... find the action card, if more than 1 action card, choose the first
-                for card in matches:
-                    if card.action != "none":
-                        choice = matches.index(card)
-                    else:
-                        choice = random.randrange(1, len(matches) + 1)
-            elif self.aiLevel == "Random mode":
-                choice = random.randrange(1, len(matches) + 1)
-                
-            # print([card.action for card in matches])
-            
-            # play the chosen card from hand, add it to the pile
-            self.play_card(matches[choice - 1], pile)
-            
-        #... can't play
+        print(player.get_hand())
+    elif event == "choices" or event == "colors" or event == "players":
+        options = args[1]
+        for index in range(len(options)):
+            # print the options with their number
+            print(str(index + 1) + ": " + str(options[index]))
+    elif event == "play":
+        print(args[2])
+    elif event == "cantplay":
+        print("You can't play, so you have to draw.")
+    elif event == "draw":
+        print("You drew: " + str(args[1]))
+        if args[2]:
+            print("Good -- you can play that!")
         else:
-            print("You can't play, so you have to draw.")
-            #input("Press enter to draw.")
-            
-            # check if deck is empty -- if so, reset it
-            if deck.is_empty():
-                deck.reset_deck(pile)
-            
-            # draw a new card from the deck
-            newcard = self.draw_card(deck)
-            print("You drew: "+str(newcard))
-            if newcard.is_match(topcard): # can be played
-                print("Good -- you can play that!")
-                self.play_card(newcard,pile)
-            
-            #... still can't play   
-            else:
-                print("Sorry, you still can't play.")
-            
-            #input("Press enter to continue.")
-        
-    def play_card(self, card, pile):
-        '''UnoPComputer.play_card(card, pile) -> None
-        plays a card from the player's hand to the pile
-        CAUTION: does not check if the play is legal!'''
-        self.hand.remove(card)
-        pile.add_card(card)
-        if card.color == "none":
-            #... computer's choice to pick color for the wild card
-            icolor = ['red', 'blue', 'green', 'yellow']
-            for index in range(4):
-                # print the color to be assigned to the wild card
-                print(str(index + 1) + ": " + str(icolor[index]))
-            # get player's choice of which color to assign
-            if self.aiLevel == "First Choice mode":
-                choice = 1
-            elif self.aiLevel == "Action mode":
-                choice = random.randrange(1, len(icolor) + 1)
-            elif self.aiLevel == "Random mode":
-                choice = random.randrange(1, len(icolor) + 1)
-            # assign the chosen color to the wild card
-            card.color = icolor[choice - 1]
-        print(pile)
+            print("Sorry, you still can't play.")
+    elif event == "nodraw":
+        print("There are no cards left to draw.")
+    elif event == "skip":
+        print(args[0].name + ", it's your turn.")
+        print("Sorry, your turn was skipped! Better luck next time!")
+    elif event == "reverse":
+        print("The reverse card has been played so the playing order has to be reversed.")
+    elif event == "drawtwo":
+        print(args[0].name + ", it's your turn.")
+        print("Sorry, you have to draw two cards and you can't play because a DrawTwo card has been played.")
+    elif event == "drawfour":
+        print(args[0].name + ", it's your turn.")
+        print("Sorry, you have to draw four cards and you can't play because a Wild DrawFour card has been played.")
+    elif event == "stack":
+        print(args[0].name + " passes the penalty on to the next player.")
+    elif event == "jumpin":
+        print(args[0].name + " jumps in with the same card!")
+    elif event == "swap":
+        print(args[0].name + " swaps hands with " + args[1].name + ".")
+    elif event == "rotate":
+        print("Every hand is passed on to the next player.")
+    elif event == "win":
+        print(args[0].get_name() + " wins!")
+        print("Thanks for playing!")
 
 #... set up the game to include computer players and/or human players
 def set_up_game(deck):
@@ -382,6 +1137,10 @@ def set_up_game(deck):
     while not numPlayers.isdigit():
         numPlayers = input("How many people are playing UNO? ")
     numPlayers = int(numPlayers)
+    #... more decks for a large table, so everyone can be dealt a hand
+    missing = 7 * numPlayers - len(deck.deck)
+    if missing > 0:
+        deck.add_decks(-(-missing // len(FULL_DECK)))
 
     # initialize list of players
     playerList = []
@@ -397,7 +1156,7 @@ def set_up_game(deck):
             name = input("Enter the name of computer: ")
             computername = 'Computer' + name
             #... pick a level for the computer player
-            ilevel = ['First Choice mode', 'Action mode', 'Random mode']
+            ilevel = AI_LEVELS
             for index in range(len(ilevel)):
                 # print the color to be assigned to the wild card
                 print(str(index + 1) + ": " + str(ilevel[index]))
@@ -416,131 +1175,477 @@ def set_up_game(deck):
     
     return playerList
 
-def play_uno():
+def draw_one(player, deck, pile):
+    '''draw_one(player, deck, pile) -> UnoCard
+    makes the player draw a card, taking the pile back to the
+      deck when the deck runs out
+    returns the card, None if there was nothing left to draw'''
+    # check if deck is empty -- if so, reset it
+    if deck.is_empty():
+        deck.reset_deck(pile)
+    #... every card is in someone's hand, nothing to draw
+    if deck.is_empty():
+        return None
+    return player.draw_card(deck)
+
+def draw_cards(player, deck, pile, count, sink=None):
+    '''draw_cards(player, deck, pile, count) -> None
+    makes the player draw count cards, taking the pile
+      back to the deck when the deck runs out'''
+    for n in range(count):
+        card = draw_one(player, deck, pile)
+        if card is None:
+            return
+        if sink is not None:
+            sink("penalty", player, card)
+
+#... the rules of the game: the turn played for each action of the top
+#... card is put together once per game by Rules.compile
+
+def standard_turn(state, player, sink):
+    '''standard_turn(state, player, sink) -> None
+    the player takes a turn'''
+    player.take_turn(state.deck, state.pile, sink)
+
+def draw_until_playable(turn):
+    '''draw_until_playable(turn) -> function
+    returns turn changed so a player who draws a card that can't be
+      played goes on drawing until one can'''
+    def variant(state, player, sink):
+        handSize = len(player.hand)
+        turn(state, player, sink)
+        #... the hand only grows if the card drawn could not be played
+        if len(player.hand) <= handSize:
+            return
+        pile = state.pile
+        row = MATCH_ROWS[pile.top_code()]
+        while True:
+            card = draw_one(player, state.deck, pile)
+            if card is None:
+                if sink is not None:
+                    sink("nodraw", player)
+                return
+            playable = row[card.code] == 1
+            if sink is not None:
+                sink("draw", player, card, playable)
+            if playable:
+                player.play_card(card, pile, sink)
+                return
+    return variant
+
+def seven_zero(turn):
+    '''seven_zero(turn) -> function
+    returns turn changed so a 7 or a 0 played moves the hands around
+      (see swap_hands)'''
+    def variant(state, player, sink):
+        handSize = len(player.hand)
+        drawn = player.drawn
+        turn(state, player, sink)
+        #... a card was played if the hand has not grown by the cards drawn
+        if len(player.hand) < handSize + player.drawn - drawn and not player.has_won():
+            swap_hands(state, player, sink)
+    return variant
+
+def swap_hands(state, player, sink):
+    '''swap_hands(state, player, sink) -> None
+    after the player has played a 7, swaps their hand with the one of
+      a player they choose, after a 0, passes every hand on to the
+      next player in the direction of play'''
+    rank = state.pile.top_card().rank
+    players = state.order.in_order()
+    if rank == 7:
+        others = [other for other in players if other is not player]
+        if sink is not None:
+            sink("players", player, others)
+        other = others[player.choose_player(others) - 1]
+        player.hand, other.hand = other.hand, player.hand
+        if sink is not None:
+            sink("swap", player, other)
+    elif rank == 0:
+        hands = [other.hand for other in players]
+        for index in range(len(players)):
+            players[index].hand = hands[index - 1]
+        if sink is not None:
+            sink("rotate", player)
+
+def play_action(turn):
+    '''play_action(turn) -> function
+    returns the function playing a turn with no action to apply:
+      the current player takes a turn'''
+    def action(state, sink):
+        player = state.order.current_player()
+        # take a turn
+        turn(state, player, sink)
+        # check for a winner
+        if player.has_won():
+            return player
+        # go to the next player
+        state.order.advance()
+        return None
+    return action
+
+def jump_in(action, sevenZero):
+    '''jump_in(action, sevenZero) -> function
+    returns action changed so a player holding the very card on top of
+      the pile (not a wild card) plays it before the current player,
+      and play goes on from them'''
+    def jump(state, sink):
+        pile = state.pile
+        order = state.order
+        top = pile.top_card()
+        if top.color != "none":
+            for steps in range(1, len(order.players)):
+                player = order.peek(steps)
+                if top in player.hand:
+                    if sink is not None:
+                        sink("jumpin", player)
+                    player.play_card(top, pile, sink)
+                    order.current = order.players.index(player)
+                    if player.has_won():
+                        return player
+                    if sevenZero:
+                        swap_hands(state, player, sink)
+                    order.advance()
+                    return None
+        return action(state, sink)
+    return jump
+
+def skip_action(state, sink):
+    '''skip_action(state, sink) -> None
+    the current player misses their turn'''
+    player = state.order.current_player()
+    if sink is not None:
+        sink("skip", player)
+    player.acknowledge()
+    #... the action is only applied once
+    state.pile.remove_action()
+    #... go to the next player
+    state.order.advance()
+    return None
+
+def reverse_action(turn):
+    '''reverse_action(turn) -> function
+    returns the function applying a reverse card: the order of play
+      is reversed and the player on the other side of the one who
+      played it takes a turn'''
+    def action(state, sink):
+        order = state.order
+        #... the player who has just played the reverse card
+        justPlayer = order.peek(-1)
+        #... A print out message to tell the "reverse"
+        if sink is not None:
+            sink("reverse", justPlayer)
+        #... the action is only applied once
+        state.pile.remove_action()
+        #... reverse the order, the next player is the one on the
+        #... other side of the player who played the reverse card
+        order.reverse()
+        order.advance(2)
+        player = order.current_player()
+        # take a turn
+        turn(state, player, sink)
+        # check for a winner
+        if player.has_won():
+            return player
+        # go to the next player
+        order.advance()
+        return None
+    return action
+
+def penalty_action(event, count):
+    '''penalty_action(event, count) -> function
+    returns the function applying a DrawTwo (event "drawtwo", count 2)
+      or a DrawFour: the current player draws the cards, with those of
+      the cards stacked under it, and misses their turn'''
+    def action(state, sink):
+        pile = state.pile
+        player = state.order.current_player()
+        if sink is not None:
+            sink(event, player)
+        player.acknowledge()
+        draw_cards(player, state.deck, pile, count + pile.penalty, sink)
+        pile.penalty = 0
+        #... the action is only applied once
+        pile.remove_action()
+        #... go to the next player
+        state.order.advance()
+        return None
+    return action
+
+#... the last option of a player who can pass a penalty on
+DRAW_INSTEAD = "Draw the cards instead"
+
+def stack_action(count, stackable, penalty):
+    '''stack_action(count, stackable, penalty) -> function
+    returns penalty changed so a player holding a card with an action
+      of stackable can play it instead, and the count cards owed are
+      passed on to the next player, or draw them (DRAW_INSTEAD)'''
+    def action(state, sink):
+        pile = state.pile
+        player = state.order.current_player()
+        stack = [card for card in player.hand if card.action in stackable]
+        if len(stack) == 0:
+            return penalty(state, sink)
+        if sink is not None:
+            sink("choices", player, stack + [DRAW_INSTEAD])
+        choice = player.choose_stack(stack)
+        if choice > len(stack):
+            return penalty(state, sink)
+        if sink is not None:
+            sink("stack", player)
+        pile.penalty += count
+        player.play_card(stack[choice - 1], pile, sink)
+        if player.has_won():
+            return player
+        state.order.advance()
+        return None
+    return action
+
+class Rules:
+    '''represents the rules of a game of Uno, the house rules are off
+      unless asked for
+    attributes:
+      stacking: a player hit by a DrawTwo can pass it on with a DrawTwo
+        or a DrawFour, one hit by a DrawFour with a DrawFour, and the
+        player who can't draws the cards of the whole stack
+      drawUntilPlayable: a player who can't play draws until a card
+        can be played, instead of drawing one
+      jumpIn: a player holding the very card on top of the pile (not a
+        wild card) plays it out of turn and play goes on from them
+      sevenZero: a player who plays a 7 swaps hands with a player of
+        their choice, one who plays a 0 passes every hand on
+      decks: int, the number of decks shuffled together, a large table
+        gets more (see new_deck)
+      deck: list of the UnoCards of one deck, FULL_DECK by default
+      lazyDeck: boolean, True to shuffle the deck as it is dealt (see
+        UnoDeck), which plays as fairly but with other random draws
+        than shuffling it up front'''
+
+    def __init__(self, stacking=False, drawUntilPlayable=False, jumpIn=False,
+                 sevenZero=False, decks=1, deck=None, lazyDeck=False):
+        '''Rules() -> Rules
+        the standard rules, with the house rules given turned on'''
+        if decks < 1:
+            raise ValueError('a game needs at least one deck')
+        self.stacking = stacking
+        self.drawUntilPlayable = drawUntilPlayable
+        self.jumpIn = jumpIn
+        self.sevenZero = sevenZero
+        self.decks = decks
+        self.deck = FULL_DECK if deck is None else list(deck)
+        self.lazyDeck = lazyDeck
+
+    def cards(self):
+        '''Rules.cards() -> list
+        returns the cards of the game, in order'''
+        return list(self.deck) * self.decks
+
+    def new_deck(self, numPlayers, rng=random):
+        '''Rules.new_deck(numPlayers, rng) -> UnoDeck
+        returns the deck of a game of numPlayers: an UnoDeck when the
+          rules have one deck and it is enough to deal every hand, an
+          UnoShoe of enough decks otherwise'''
+        decks = max(self.decks, decks_needed(numPlayers, len(self.deck)))
+        if decks == 1:
+            return UnoDeck(rng, self.deck, self.lazyDeck)
+        return UnoShoe(rng, decks, self.deck)
+
+    def compile(self):
+        '''Rules.compile() -> dict
+        returns the function playing a turn for each action the top
+          card can have, called as function(state, sink) and returning
+          the player who has won or None: the house rules are built in
+          once here instead of being checked turn after turn'''
+        turn = standard_turn
+        if self.drawUntilPlayable:
+            turn = draw_until_playable(turn)
+        if self.sevenZero:
+            turn = seven_zero(turn)
+        play = play_action(turn)
+        if self.jumpIn:
+            play = jump_in(play, self.sevenZero)
+        drawtwo = penalty_action("drawtwo", 2)
+        drawfour = penalty_action("drawfour", 4)
+        if self.stacking:
+            drawtwo = stack_action(2, ["drawtwo", "drawfour"], drawtwo)
+            drawfour = stack_action(4, ["drawfour"], drawfour)
+        #... a wild card has no action left once its color is chosen
+        return {"none": play, "wild": play, "skip": skip_action,
+                "reverse": reverse_action(turn),
+                "drawtwo": drawtwo, "drawfour": drawfour}
+
+STANDARD_RULES = Rules()
+
+def decks_needed(numPlayers, deckSize=len(FULL_DECK)):
+    '''decks_needed(numPlayers) -> int
+    returns the number of decks needed to deal a hand to every
+      player and start the pile'''
+    return max(1, -(-(7 * numPlayers + 1) // deckSize))
+
+def run_game(playerList, deck, pile, sink=None, rng=random, maxTurns=None, metrics=None,
+             rules=None):
+    '''run_game(playerList, deck, pile) -> dict
+    plays a game of Uno between the players until one wins
+      sink is an optional callable receiving the game events
+        (see console_sink), the game is silent without it
+      rng is the random source used to pick the first player
+      maxTurns stops a game that has not finished in time
+      metrics is an optional metrics.Metrics timing the turns
+      rules are the Rules of the game, the standard ones if not given
+    returns a dict with the winner (None if stopped), its seat
+      in playerList, the number of turns and the cards drawn'''
+    
+    # randomly assign who goes first
+    state = GameState(playerList, deck, pile, rng.randrange(len(playerList)), rules)
+    return play_game(state, sink, maxTurns, metrics)
+
+def play_game(state, sink=None, maxTurns=None, metrics=None):
+    '''play_game(state) -> dict
+    plays the game in a GameState on until one player wins,
+      see run_game for the arguments and the result'''
+    order = state.order
+    if metrics is not None:
+        #... the metrics get the events first and pass them on
+        sink = metrics.instrument(state, sink)
+    start_game(state, sink)
+
+    winner = None
+    # play the game
+    while winner is None and (maxTurns is None or state.turns < maxTurns):
+        winner = play_turn(state, sink)
+
+    if winner is not None and sink is not None:
+        sink("win", winner)
+    result = {'winner': None if winner is None else winner.name,
+              'seat': None if winner is None else order.current,
+              'turns': state.turns,
+              'drawn': sum(player.drawn for player in order.players)}
+    if metrics is not None:
+        metrics.finish(state, result)
+    return result
+
+def start_game(state, sink=None):
+    '''start_game(state) -> None
+    seats the players of a GameState at the table'''
+    order = state.order
+    for player in order.players:
+        player.join(order, state.deck, state.pile, state.rules)
+    if sink is not None:
+        sink("start", order, state.pile)
+
+def play_turn(state, sink=None):
+    '''play_turn(state) -> UnoPlayer
+    plays one turn of the game in a GameState: applies the action
+      of the top card or lets the current player take a turn
+    returns the player who has won, None if nobody has yet'''
+    pile = state.pile
+    state.turns += 1
+        
+    # print the game status
+    if sink is not None:
+        sink("status", state.order.in_order())
+
+    #... the function of the top card's action, see Rules.compile
+    return state.actions[pile.check_action()](state, sink)
+
+def play_uno(metrics=None, rules=None):
     '''play_uno(numPlayers) -> None
-    plays a game of Uno with numPlayers'''
+    plays a game of Uno with numPlayers
+      metrics is an optional metrics.Metrics timing the turns
+      rules are the Rules of the game, the standard ones if not given'''
     
     # set up full deck and initial discard pile
-    deck = UnoDeck()
+    if rules is None:
+        rules = STANDARD_RULES
+    deck = rules.new_deck(0)
     pile = UnoPile(deck)
     
     # set up the players, get players' names and types
     playerList = set_up_game(deck)
-    #... number of players
-    numPlayers = len(playerList)
-  
-    # randomly assign who goes first
-    currentPlayerNum = random.randrange(numPlayers)
-    
-    #... print to verify
-    #print([player.name for player in playerList])
 
+    # randomly assign who goes first
+    state = GameState(playerList, deck, pile, random.randrange(len(playerList)), rules)
     # play the game
-    while True:
-        
-        # print the game status
-        print('-------')
-        for player in playerList:
-            print(player)
-        print('-------')
+    play_game(state, console_sink, metrics=metrics)
 
-        #... check action card
-        action = pile.check_action()
-        
-        #... check if the player is a computer player
-        if "Computer" in playerList[currentPlayerNum].name:
-            iscomputer = True
-        else:
-            iscomputer = False
-    
-        #... action card: skip
-        if action == "skip":
-            player = playerList[currentPlayerNum]
-            print(player.name + ", it's your turn.")
-            print("Sorry, your turn was skipped! Better luck next time!")
-            if not iscomputer:
-                input("Press enter to continue.")
-            #... the action is only applied once
-            pile.remove_action()
-            #... go to the next player
-            currentPlayerNum = (currentPlayerNum + 1) % numPlayers
-
-        #... action card:reverse
-        elif action == "reverse":
-            #... return to the player who has just played before reverse
-            justPlayerNum = (currentPlayerNum + numPlayers - 1) % numPlayers
-            justPlayer = playerList[justPlayerNum]
-            #... A print out message to tell the "reverse"
-            print("The reverse card has been played so the playing order has to be reversed.")
-            #... reverse the player list
-            playerList.reverse()
-            #... this is a print out to test if the player list has been reversed successfully
-            #print("play list after reverse:", [player.name for player in playerList])
-            #... the action is only applied once
-            pile.remove_action()
-            #... make a dictionary to map the player name with the list index after reverse
-            listInd = list(range(numPlayers))
-            listPlayername = [player.name for player in playerList]
-            playerDict = dict(zip(listPlayername, listInd))
-            
-            #... reset current player after reverse
-            currentPlayerNum = (playerDict[justPlayer.name] + 1) % numPlayers
-            if "Computer" in playerList[currentPlayerNum].name:
-                iscomputer = True
-            else:
-                iscomputer = False
-                
-            # take a turn
-            playerList[currentPlayerNum].take_turn(deck, pile)
-            # check for a winner
-            if playerList[currentPlayerNum].has_won():
-                print(playerList[currentPlayerNum].get_name() + " wins!")
-                print("Thanks for playing!")
-                break
-            # go to the next player
-            currentPlayerNum = (currentPlayerNum + 1) % numPlayers
-        
-        #... action card: drawtwo
-        elif action == "drawtwo":
-            #... check the current player
-            player = playerList[currentPlayerNum]
-            print(player.name + ", it's your turn.")
-            print("Sorry, you have to draw two cards and you can't play because a DrawTwo card has been played.")
-            if not iscomputer:
-                input("Press enter to continue.")
-            #... draw two cards
-            playerList[currentPlayerNum].draw_card(deck)
-            playerList[currentPlayerNum].draw_card(deck)
-            #... the action is only applied once
-            pile.remove_action()
-            #... go to the next player
-            currentPlayerNum = (currentPlayerNum + 1) % numPlayers
-        
-        #... action card: drawfour
-        elif action == "drawfour":
-            #... check the current player
-            player = playerList[currentPlayerNum]
-            print(player.name + ", it's your turn.")
-            print("Sorry, you have to draw four cards and you can't play because a Wild DrawFour card has been played.")
-            if not iscomputer:
-                input("Press enter to continue.")
-            #... draw four cards
-            playerList[currentPlayerNum].draw_card(deck)
-            playerList[currentPlayerNum].draw_card(deck)
-            playerList[currentPlayerNum].draw_card(deck)
-            playerList[currentPlayerNum].draw_card(deck)
-            #... the action is only applied once
-            pile.remove_action()
-            #... go to the next player
-            currentPlayerNum = (currentPlayerNum + 1) % numPlayers
-            
+#... headless games between computer players
+def game_seed(seed, index):
+    '''game_seed(seed, index) -> str
+    returns the seed of game number index in a run started with seed,
+      every game gets its own random stream'''
+    return str(seed) + ':' + str(index)
+
+def simulate_game(aiLevels, rng=random, sink=None, maxTurns=10000, metrics=None, rules=None):
+    '''simulate_game(aiLevels) -> dict
+    plays one game between computer players without any console I/O
+      aiLevels is a list with the AI level of each seat
+      rules are the Rules of the game, the standard ones if not given
+    returns the result dict of run_game'''
+    if rules is None:
+        rules = STANDARD_RULES
+    deck = rules.new_deck(len(aiLevels), rng)
+    pile = UnoPile(deck)
+    playerList = [UnoComputer('Computer' + str(n + 1), deck, aiLevels[n], rng)
+                  for n in range(len(aiLevels))]
+    return run_game(playerList, deck, pile, sink, rng, maxTurns, metrics, rules)
+
+def simulate_games(n, aiLevels, seed=None, sink=None, maxTurns=10000, metrics=None,
+                   rules=None):
+    '''simulate_games(n, aiLevels, seed) -> list
+    plays n games between computer players without any console I/O
+      aiLevels is a list with the AI level of each seat
+      seed makes the run reproducible, game i always plays the same
+        way for the same seed (see game_seed)
+      sink is an optional callable receiving the game events
+      metrics is an optional metrics.Metrics timing the turns
+      rules are the Rules of the games, the standard ones if not given
+    returns a list of result dicts, one per game'''
+    results = []
+    for index in range(n):
+        if seed is None:
+            rng = random.Random()
         else:
-            # take a turn
-            playerList[currentPlayerNum].take_turn(deck, pile)
-            # check for a winner
-            if playerList[currentPlayerNum].has_won():
-                print(playerList[currentPlayerNum].get_name() + " wins!")
-                print("Thanks for playing!")
-                break
-            # go to the next player
-            currentPlayerNum = (currentPlayerNum + 1) % numPlayers
+            rng = random.Random(game_seed(seed, index))
+        results.append(simulate_game(aiLevels, rng, sink, maxTurns, metrics, rules))
+    return results
+
+if __name__ == "__main__":
+    #... only what the command needs is imported, "simulate" never prompts
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m uno', description='Uno')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('play', help='play a game on the console')
+    simulate = commands.add_parser('simulate', help='play games between computers, without prompts')
+    simulate.add_argument('--players', default='First Choice mode,Action mode,Random mode',
+                          help='AI levels of the seats, separated by commas')
+    simulate.add_argument('--games', type=int, default=1000)
+    simulate.add_argument('--seed', default=0)
+    simulate.add_argument('--workers', type=int, default=1,
+                          help='processes to play on, 0 for all cores (default 1)')
+    simulate.add_argument('--rotate', action='store_true', help='move the players one seat per game')
+    simulate.add_argument('--max-turns', type=int, default=10000)
+    simulate.add_argument('--quiet', action='store_true', help='print only the summary line')
+    args = parser.parse_args()
+
+    if args.command == 'simulate':
+        import time
+        #... the module imported by name, so the workers and this process
+        #... share its strategies
+        import tournament
+        roster = args.players.split(',')
+        for level in roster:
+            if level not in AI_LEVELS:
+                simulate.error('unknown AI level ' + level + ', choose from ' + ', '.join(AI_LEVELS))
+        if len(roster) < 2:
+            simulate.error('a game needs two players')
+        start = time.perf_counter()
+        table = tournament.run_tournament(roster, args.games, args.seed, args.workers or None,
+                                          args.rotate, maxTurns=args.max_turns)
+        seconds = time.perf_counter() - start
+        if not args.quiet:
+            print(tournament.format_table(table), end='')
+        print('%d games, %d turns in %.2f s: %.0f games/sec, %.0f turns/sec' % (
+            table['games'], table['turns'], seconds, table['games'] / max(seconds, 1e-9),
+            table['turns'] / max(seconds, 1e-9)))
+    else:
+        play_uno()